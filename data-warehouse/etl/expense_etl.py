@@ -10,11 +10,15 @@ import numpy as np
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import importlib
+import sys
 import logging
 import json
 import yaml
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, inspect
 from sqlalchemy.orm import sessionmaker
 import psycopg2
 from psycopg2.extras import RealDictCursor
@@ -22,6 +26,9 @@ from psycopg2.extras import RealDictCursor
 import boto3
 from botocore.exceptions import ClientError
 
+# Default location of the shared ml/training modules (override with ml_module_path)
+DEFAULT_ML_MODULE_PATH = Path(__file__).resolve().parents[2] / 'ml' / 'training'
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,13 +40,20 @@ class ExpenseETL:
     def __init__(self, config_path: str = "config/etl_config.yaml"):
         """Initialize the ETL pipeline with configuration"""
         self.config = self.load_config(config_path)
+        self.setup_ml_modules()
         self.setup_connections()
+        self.categorizer = self.setup_categorizer()
+        self.feature_store = self.setup_feature_store()
         
         # ETL state tracking
         self.last_run_time = None
         self.processed_records = 0
         self.failed_records = 0
         
+        # Backfill coordination
+        self._state_lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        
     def load_config(self, config_path: str) -> Dict:
         """Load ETL configuration from YAML file"""
         try:
@@ -51,6 +65,24 @@ class ExpenseETL:
             logger.error(f"Failed to load configuration: {e}")
             raise
     
+    def setup_ml_modules(self):
+        """Make the feature, predictor and feature store modules shared with ml/training importable"""
+        categorization_config = self.config.get('categorization') or {}
+        module_path = Path(
+            self.config.get('ml_module_path')
+            or categorization_config.get('module_path')
+            or DEFAULT_ML_MODULE_PATH
+        )
+        if str(module_path) not in sys.path:
+            sys.path.append(str(module_path))
+        
+        try:
+            importlib.import_module('expense_features')
+            logger.info(f"Shared ML modules loaded from {module_path}")
+        except ImportError as e:
+            logger.error(f"Failed to import shared ML modules from {module_path}: {e}")
+            raise
+    
     def setup_connections(self):
         """Setup database and S3 connections"""
         try:
@@ -84,6 +116,62 @@ class ExpenseETL:
             logger.error(f"Failed to setup connections: {e}")
             raise
     
+    def setup_categorizer(self):
+        """Load the saved expense categorization model, if configured"""
+        categorization_config = self.config.get('categorization')
+        if not categorization_config:
+            return None
+        
+        try:
+            # The predictor lives alongside the training code (see setup_ml_modules)
+            from expense_predictor import ExpenseCategoryPredictor
+            from prediction_cache import PredictionCache
+            
+            # Repeated descriptions/vendors are scored once per model version;
+            # `cache: true` enables it with the defaults
+            cache_config = categorization_config.get('cache')
+            if cache_config is True:
+                cache_config = {}
+            cache = PredictionCache(
+                max_entries=cache_config.get('max_entries', 100_000),
+                storage_path=cache_config.get('storage_path'),
+                max_versions=cache_config.get('max_versions', 3),
+                version_ttl=cache_config.get('version_ttl_days', 7) * 24 * 3600
+            ) if isinstance(cache_config, dict) else None
+            
+            categorizer = ExpenseCategoryPredictor(
+                model_path=categorization_config.get('model_path', 'models/'),
+                model_name=categorization_config.get('model_name', 'expense_categorization_model'),
+                model_format=categorization_config.get('model_format', 'pickle'),
+                cache=cache
+            )
+            logger.info("Expense categorization model loaded")
+            return categorizer
+            
+        except Exception as e:
+            logger.error(f"Failed to load categorization model: {e}")
+            raise
+    
+    def setup_feature_store(self):
+        """Open the versioned feature store shared with model training, if configured"""
+        feature_store_config = self.config.get('feature_store')
+        if not feature_store_config:
+            return None
+        
+        try:
+            from feature_store import FeatureStore
+            
+            feature_store = FeatureStore(
+                feature_store_config['path'],
+                n_features=feature_store_config.get('n_features', 2 ** 16)
+            )
+            logger.info(f"Feature store version {feature_store.version} at {feature_store_config['path']}")
+            return feature_store
+            
+        except Exception as e:
+            logger.error(f"Failed to open feature store: {e}")
+            raise
+    
     def extract_expenses(self, start_date: datetime, end_date: datetime) -> pd.DataFrame:
         """Extract expense data from source database"""
         logger.info(f"Extracting expenses from {start_date} to {end_date}")
@@ -215,8 +303,6 @@ class ExpenseETL:
         df_transformed['year'] = df_transformed['date'].dt.year
         df_transformed['month'] = df_transformed['date'].dt.month
         df_transformed['quarter'] = df_transformed['date'].dt.quarter
-        df_transformed['day_of_week'] = df_transformed['date'].dt.dayofweek
-        df_transformed['is_weekend'] = df_transformed['day_of_week'].isin([5, 6]).astype(int)
         df_transformed['is_month_end'] = df_transformed['date'].dt.is_month_end.astype(int)
         df_transformed['is_quarter_end'] = df_transformed['date'].dt.is_quarter_end.astype(int)
         df_transformed['is_year_end'] = df_transformed['date'].dt.is_year_end.astype(int)
@@ -228,15 +314,14 @@ class ExpenseETL:
             labels=['0-10', '10-50', '50-100', '100-500', '500-1000', '1000+']
         )
         
-        # Text analysis
-        df_transformed['description_length'] = df_transformed['description'].str.len()
-        df_transformed['word_count'] = df_transformed['description'].str.split().str.len()
+        # Text, vendor and date features, computed exactly as the categorization model sees them
+        from expense_features import derive_row_features
+        row_features = derive_row_features(df_transformed)
+        for column in ['day_of_week', 'is_weekend', 'description_length', 'word_count',
+                       'vendor_clean', 'vendor_length']:
+            df_transformed[column] = row_features[column]
         df_transformed['has_receipt'] = df_transformed['receipt_url'].notna().astype(int)
         
-        # Vendor analysis
-        df_transformed['vendor_clean'] = df_transformed['vendor'].str.lower().str.strip()
-        df_transformed['vendor_length'] = df_transformed['vendor'].str.len()
-        
         # Category standardization
         df_transformed['category_standardized'] = df_transformed['category'].str.lower().str.strip()
         
@@ -264,6 +349,23 @@ class ExpenseETL:
         df_transformed['vendor'] = df_transformed['vendor'].fillna('Unknown')
         df_transformed['description'] = df_transformed['description'].fillna('No description')
         
+        # Fill uncategorized expenses in bulk with the categorization model
+        uncategorized = df_transformed['category'] == 'Uncategorized'
+        df_transformed['is_auto_categorized'] = 0
+        if self.categorizer is not None and uncategorized.any():
+            predictions, cache_stats = self.categorizer.predict_with_stats(df_transformed.loc[uncategorized])
+            df_transformed.loc[uncategorized, 'category'] = predictions
+            df_transformed.loc[uncategorized, 'is_auto_categorized'] = 1
+            df_transformed['category_standardized'] = df_transformed['category'].str.lower().str.strip()
+            logger.info(f"Auto-categorized {int(uncategorized.sum())} expenses")
+            if self.categorizer.cache is not None:
+                # Counted from this call's own keys; backfill partitions share the cache concurrently
+                logger.info(
+                    f"Categorization cache hit rate {cache_stats['hit_rate']:.1%} for this batch, "
+                    f"scoring avoided for {cache_stats['scoring_avoided']:.1%} of "
+                    f"{cache_stats['lookups']} lookups"
+                )
+        
         # Create composite keys
         df_transformed['expense_key'] = (
             df_transformed['organization_id'].astype(str) + '_' +
@@ -391,6 +493,18 @@ class ExpenseETL:
             logger.error(f"Failed to load data to {table_name}: {e}")
             raise
     
+    def load_to_feature_store(self, df: pd.DataFrame, start_date: datetime, end_date: datetime):
+        """Persist model-ready features for a processed date range"""
+        if self.feature_store is None:
+            return
+        
+        try:
+            rows = self.feature_store.write(df, start_date, end_date)
+            logger.info(f"Wrote {rows} feature rows to feature store version {self.feature_store.version}")
+        except Exception as e:
+            logger.error(f"Failed to write features: {e}")
+            raise
+    
     def load_to_data_lake(self, df: pd.DataFrame, s3_key: str):
         """Load raw data to S3 data lake"""
         logger.info(f"Loading {len(df)} records to S3: {s3_key}")
@@ -508,6 +622,9 @@ class ExpenseETL:
             s3_key = f"expenses/raw/{start_date.strftime('%Y/%m/%d')}/expenses_{start_date.strftime('%Y%m%d')}.parquet"
             self.load_to_data_lake(expenses_df, s3_key)
             
+            # Persist model-ready features for training
+            self.load_to_feature_store(expenses_transformed, start_date, end_date)
+            
             # Create aggregated tables
             self.create_aggregated_tables()
             
@@ -546,6 +663,204 @@ class ExpenseETL:
         }
         with open(state_file, 'w') as f:
             json.dump(state, f, indent=2)
+    
+    def generate_partitions(self, start_date: datetime, end_date: datetime,
+                            granularity: str = 'day') -> List[Tuple[datetime, datetime]]:
+        """Split an inclusive date range into day or month partitions"""
+        if granularity not in ('day', 'month'):
+            raise ValueError(f"Unsupported partition granularity: {granularity}")
+        
+        partitions = []
+        current = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        while current <= end_date:
+            if granularity == 'day':
+                next_start = current + timedelta(days=1)
+            else:
+                next_start = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+            
+            # Partitions are inclusive like the --start-date/--end-date range
+            partition_end = min(next_start - timedelta(days=1), end_date)
+            partitions.append((current, partition_end))
+            current = next_start
+        
+        return partitions
+    
+    def partition_id(self, partition_start: datetime, granularity: str) -> str:
+        """Stable identifier for a backfill partition"""
+        if granularity == 'month':
+            return f"month:{partition_start.strftime('%Y-%m')}"
+        return f"day:{partition_start.strftime('%Y-%m-%d')}"
+    
+    def partition_s3_key(self, partition_start: datetime, granularity: str) -> str:
+        """Data lake key for a backfill partition"""
+        if granularity == 'month':
+            return f"expenses/raw/{partition_start.strftime('%Y/%m')}/expenses_{partition_start.strftime('%Y%m')}.parquet"
+        return f"expenses/raw/{partition_start.strftime('%Y/%m/%d')}/expenses_{partition_start.strftime('%Y%m%d')}.parquet"
+    
+    def load_partition_to_data_warehouse(self, df: pd.DataFrame, table_name: str,
+                                         start_date: datetime, end_date: datetime):
+        """Idempotently replace one date partition of a fact table"""
+        logger.info(f"Loading {len(df)} records to {table_name} partition {start_date.date()}..{end_date.date()}")
+        
+        try:
+            # Create the table once so concurrent partitions don't race on DDL
+            with self._schema_lock:
+                if not inspect(self.dw_engine).has_table(table_name):
+                    df.head(0).to_sql(table_name, self.dw_engine, if_exists='append', index=False)
+            
+            # Delete and re-insert the partition in a single transaction
+            with self.dw_engine.begin() as conn:
+                conn.execute(
+                    text(f"DELETE FROM {table_name} WHERE date BETWEEN :start_date AND :end_date"),
+                    {'start_date': start_date, 'end_date': end_date}
+                )
+                df.to_sql(
+                    table_name,
+                    conn,
+                    if_exists='append',
+                    index=False,
+                    method='multi',
+                    chunksize=1000
+                )
+            
+            logger.info(f"Successfully loaded {len(df)} records to {table_name}")
+            
+        except Exception as e:
+            logger.error(f"Failed to load partition to {table_name}: {e}")
+            raise
+    
+    def load_backfill_state(self, state_file: Path) -> Dict:
+        """Load backfill progress, keyed by run, from the state file"""
+        if state_file.exists():
+            with open(state_file, 'r') as f:
+                state = json.load(f)
+            state.setdefault('runs', {})
+            return state
+        return {'runs': {}}
+    
+    def save_backfill_state(self, state: Dict, state_file: Path):
+        """Atomically persist backfill progress"""
+        tmp_file = state_file.with_suffix(state_file.suffix + '.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f, indent=2)
+        tmp_file.replace(state_file)
+    
+    def backfill_run_id(self, start_date: datetime, end_date: datetime, granularity: str) -> str:
+        """Identifier of one backfill invocation's range and granularity"""
+        return f"{granularity}:{start_date.strftime('%Y-%m-%d')}..{end_date.strftime('%Y-%m-%d')}"
+    
+    def run_partition(self, start_date: datetime, end_date: datetime, granularity: str,
+                      source_slots: threading.BoundedSemaphore) -> int:
+        """Extract, transform and load a single backfill partition"""
+        # Only hold a source connection slot for the extract itself
+        with source_slots:
+            expenses_df = self.extract_expenses(start_date, end_date)
+        
+        expenses_transformed = self.transform_expenses(expenses_df)
+        self.load_partition_to_data_warehouse(
+            expenses_transformed, 'fact_expenses', start_date, end_date
+        )
+        self.load_to_data_lake(expenses_df, self.partition_s3_key(start_date, granularity))
+        self.load_to_feature_store(expenses_transformed, start_date, end_date)
+        
+        return len(expenses_df)
+    
+    def run_backfill(self, start_date: datetime, end_date: datetime, granularity: str = 'day',
+                     max_workers: Optional[int] = None, restart: bool = False):
+        """Re-process a historical range as parallel, resumable partitions"""
+        backfill_config = self.config.get('backfill', {})
+        max_workers = max_workers or backfill_config.get('max_workers', 4)
+        max_source_connections = backfill_config.get('max_source_connections', 4)
+        state_file = Path(backfill_config.get('state_file', 'backfill_state.json'))
+        
+        partitions = self.generate_partitions(start_date, end_date, granularity)
+        
+        # Progress is kept per run and dropped once the run succeeds, so
+        # re-running a finished range reprocesses it instead of skipping it
+        state = self.load_backfill_state(state_file)
+        run_id = self.backfill_run_id(start_date, end_date, granularity)
+        if restart or run_id not in state['runs']:
+            state['runs'][run_id] = {'partitions': {}}
+        run_state = state['runs'][run_id]
+        pending = [
+            (p_start, p_end) for p_start, p_end in partitions
+            if run_state['partitions'].get(self.partition_id(p_start, granularity), {}).get('status') != 'completed'
+        ]
+        
+        logger.info(
+            f"Starting backfill from {start_date} to {end_date}: {len(partitions)} {granularity} partitions, "
+            f"{len(pending)} pending, {max_workers} workers, {max_source_connections} source connections"
+        )
+        
+        if not pending:
+            # Only reachable when a previous run loaded every partition but
+            # stopped before finishing; rebuild aggregates without reloading
+            if run_state['partitions']:
+                self.finish_backfill(state, run_id, state_file)
+            logger.info("No pending backfill partitions")
+            return
+        
+        # Dimensions are small full refreshes; load them once up front
+        organizations_transformed = self.transform_organizations(self.extract_organizations())
+        users_transformed = self.transform_users(self.extract_users())
+        self.load_to_data_warehouse(organizations_transformed, 'dim_organizations')
+        self.load_to_data_warehouse(users_transformed, 'dim_users')
+        
+        source_slots = threading.BoundedSemaphore(max_source_connections)
+        self.processed_records = 0
+        self.failed_records = 0
+        failed_partitions = []
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.run_partition, p_start, p_end, granularity, source_slots): p_start
+                for p_start, p_end in pending
+            }
+            
+            for future in as_completed(futures):
+                partition_key = self.partition_id(futures[future], granularity)
+                try:
+                    records = future.result()
+                    entry = {
+                        'status': 'completed',
+                        'records': records,
+                        'completed_at': datetime.now().isoformat()
+                    }
+                    self.processed_records += records
+                    logger.info(f"Backfill partition {partition_key} completed ({records} records)")
+                except Exception as e:
+                    entry = {
+                        'status': 'failed',
+                        'error': str(e),
+                        'failed_at': datetime.now().isoformat()
+                    }
+                    failed_partitions.append(partition_key)
+                    logger.error(f"Backfill partition {partition_key} failed: {e}")
+                
+                with self._state_lock:
+                    run_state['partitions'][partition_key] = entry
+                    self.save_backfill_state(state, state_file)
+        
+        self.failed_records = len(failed_partitions)
+        if failed_partitions:
+            raise RuntimeError(
+                f"Backfill finished with {len(failed_partitions)} failed partitions: "
+                f"{', '.join(sorted(failed_partitions))}"
+            )
+        
+        self.finish_backfill(state, run_id, state_file)
+        logger.info(f"Backfill completed successfully. Processed {self.processed_records} records")
+    
+    def finish_backfill(self, state: Dict, run_id: str, state_file: Path):
+        """Rebuild aggregates once over the backfilled fact table and forget the run's progress"""
+        self.create_aggregated_tables()
+        self.last_run_time = datetime.now()
+        
+        del state['runs'][run_id]
+        if state['runs']:
+            self.save_backfill_state(state, state_file)
+        elif state_file.exists():
+            state_file.unlink()
 
 def main():
     """Main function"""
@@ -555,6 +870,10 @@ def main():
     parser.add_argument('--start-date', required=True, help='Start date (YYYY-MM-DD)')
     parser.add_argument('--end-date', required=True, help='End date (YYYY-MM-DD)')
     parser.add_argument('--incremental', action='store_true', help='Run incremental ETL')
+    parser.add_argument('--backfill', action='store_true', help='Run a partitioned, resumable backfill')
+    parser.add_argument('--partition-by', choices=['day', 'month'], default='day', help='Backfill partition granularity')
+    parser.add_argument('--max-workers', type=int, help='Concurrent backfill partitions')
+    parser.add_argument('--restart', action='store_true', help='Ignore backfill progress and redo all partitions')
     parser.add_argument('--config', default='config/etl_config.yaml', help='ETL configuration file')
     
     args = parser.parse_args()
@@ -565,6 +884,11 @@ def main():
     if args.incremental:
         # Run incremental ETL
         etl.run_incremental_etl()
+    elif args.backfill:
+        # Run partitioned backfill
+        start_date = datetime.strptime(args.start_date, '%Y-%m-%d')
+        end_date = datetime.strptime(args.end_date, '%Y-%m-%d')
+        etl.run_backfill(start_date, end_date, args.partition_by, args.max_workers, args.restart)
     else:
         # Run full ETL
         start_date = datetime.strptime(args.start_date, '%Y-%m-%d')
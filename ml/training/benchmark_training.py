@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Expense Categorization Training Benchmark
+Generates seeded synthetic expense data with realistic category imbalance,
+runs ExpenseCategorizationTrainer.train() with its own methods instrumented
+as timed and memory-profiled phases (feature derivation, TF-IDF, combining
+or densifying, resampling, scaling, training, tuning, saving), adds the
+scheduler's per-model holdout and CV fold fit times, and writes a
+machine-readable JSON report. A stored baseline report can be used to fail
+the run on regressions.
+
+Runs fully offline: MLflow is pointed at a local file store.
+"""
+
+import pandas as pd
+import numpy as np
+import functools
+import importlib.util
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from imbalance import IMBALANCE_STRATEGIES, make_sampler, balanced_sample_weight
+from tracking import ExperimentTracker
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# category: (description templates, vendors, lognormal amount mu/sigma)
+CATEGORY_PROFILES = {
+    'Meals': (['Lunch at {v}', 'Client dinner {v}', 'Coffee meeting at {v}', 'Team breakfast {v}'],
+              ['Starbucks', "McDonald's", 'Chipotle', 'Local Bistro', 'Panera'], (3.0, 0.6)),
+    'Transportation': (['Uber ride', 'Lyft to client office', 'Gas station fill-up {v}', 'Parking fee {v}'],
+                       ['Uber', 'Lyft', 'Shell', 'Chevron', 'Parking Garage'], (3.2, 0.7)),
+    'Software': (['{v} monthly subscription', '{v} annual license', 'Cloud hosting {v}', '{v} seats'],
+                 ['AWS', 'Adobe', 'Slack', 'GitHub', 'Atlassian'], (4.5, 1.0)),
+    'Office Supplies': (['Office supplies from {v}', 'Printer paper {v}', 'Desk chair {v}', 'Toner {v}'],
+                        ['Staples', 'Office Depot', 'Amazon'], (3.5, 0.8)),
+    'Travel': (['Hotel accommodation {v}', 'Flight ticket {v}', 'Airport shuttle', 'Conference travel {v}'],
+               ['Hilton', 'Marriott', 'Delta', 'United', 'Expedia'], (5.5, 0.7)),
+    'Utilities': (['{v} electricity bill', 'Internet service {v}', 'Phone bill {v}'],
+                  ['Comcast', 'Verizon', 'PG&E', 'AT&T'], (4.8, 0.5)),
+    'Marketing': (['{v} ads campaign', 'Sponsored post {v}', 'Trade show booth'],
+                  ['Google Ads', 'Facebook', 'LinkedIn'], (6.0, 1.1)),
+    'Professional Services': (['Legal consultation {v}', 'Accounting services {v}', 'Contractor invoice'],
+                              ['Deloitte', 'Law Office', 'Upwork'], (6.5, 0.9)),
+    'Training': (['Online course {v}', 'Workshop registration', 'Certification exam {v}'],
+                 ['Coursera', 'Udemy', 'Pluralsight'], (5.0, 0.8)),
+    'Equipment': (['Laptop purchase {v}', 'Monitor {v}', 'Keyboard and mouse {v}'],
+                  ['Apple', 'Dell', 'Best Buy'], (6.8, 0.6)),
+    'Insurance': (['{v} liability insurance', 'Health insurance premium {v}'],
+                  ['State Farm', 'Allstate', 'Aetna'], (6.2, 0.4)),
+    'Rent': (['Office rent {v}', 'Coworking membership {v}'],
+             ['WeWork', 'Regus', 'Landlord LLC'], (7.8, 0.3))
+}
+
+
+def generate_expenses(n_rows: int, seed: int = 42, imbalance: float = 1.2) -> pd.DataFrame:
+    """Seeded synthetic expenses with Zipf-distributed category frequencies"""
+    rng = np.random.default_rng(seed)
+    categories = list(CATEGORY_PROFILES)
+    weights = 1.0 / np.arange(1, len(categories) + 1) ** imbalance
+    category_idx = rng.choice(len(categories), size=n_rows, p=weights / weights.sum())
+
+    descriptions = np.empty(n_rows, dtype=object)
+    vendors = np.empty(n_rows, dtype=object)
+    amounts = np.empty(n_rows)
+
+    for idx, category in enumerate(categories):
+        rows = np.flatnonzero(category_idx == idx)
+        if not len(rows):
+            continue
+        templates, vendor_names, (mu, sigma) = CATEGORY_PROFILES[category]
+        row_vendors = np.asarray(vendor_names, dtype=object)[rng.integers(len(vendor_names), size=len(rows))]
+        row_templates = np.asarray(templates, dtype=object)[rng.integers(len(templates), size=len(rows))]
+        descriptions[rows] = [t.format(v=v) for t, v in zip(row_templates, row_vendors)]
+        vendors[rows] = row_vendors
+        amounts[rows] = np.round(rng.lognormal(mu, sigma, size=len(rows)), 2)
+
+    # Noise: invoice/reference numbers on a fifth of descriptions
+    has_reference = rng.random(n_rows) < 0.2
+    references = rng.integers(1000, 99999, size=int(has_reference.sum()))
+    descriptions[has_reference] = [f"{d} #{r}" for d, r in zip(descriptions[has_reference], references)]
+
+    start = np.datetime64('2023-01-01')
+    dates = start + rng.integers(0, 730, size=n_rows).astype('timedelta64[D]')
+
+    return pd.DataFrame({
+        'description': descriptions,
+        'amount': amounts,
+        'category': np.asarray(categories, dtype=object)[category_idx],
+        'date': dates,
+        'vendor': vendors
+    })
+
+
+def load_trainer_module():
+    """Import the training script, whose file name is not a valid module name"""
+    path = Path(__file__).with_name('expense-categorization.py')
+    spec = importlib.util.spec_from_file_location('expense_categorization', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class PhaseProfiler:
+    """Times and memory-profiles named, possibly nested, phases
+
+    A nested phase is reported on its own and is also included in its
+    parent's figures. Repeated calls of a phase accumulate seconds and keep
+    the largest peak. peak_mb is this process's tracemalloc peak within the
+    phase (memory traced since the outermost phase began). RSS figures come
+    from getrusage and are high-water marks: max_rss_growth_mb is how far the
+    phase raised the process high-water mark, and workers_max_rss_mb is the
+    largest RSS of any pool worker reaped so far (cumulative, not per phase),
+    covering the scheduler's worker processes that tracemalloc cannot see.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.phases = {}
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name: str):
+        parent = self._stack[-1] if self._stack else None
+        frame = {'name': name, 'peak': 0}
+        stats = self.phases.setdefault(name, {
+            'parent': parent['name'] if parent else None, 'calls': 0, 'seconds': 0.0,
+            'peak_mb': None, 'max_rss_growth_mb': 0.0, 'workers_max_rss_mb': 0.0
+        })
+
+        if self.trace_memory:
+            if parent is None:
+                tracemalloc.start()
+            else:
+                # Keep the parent's peak so far, then measure this phase on its own
+                parent['peak'] = max(parent['peak'], tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+        self._stack.append(frame)
+        print(f"{'  ' * len(self._stack)}{name}...", flush=True)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+            peak_mb = None
+            if self.trace_memory:
+                frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                if parent is None:
+                    tracemalloc.stop()
+                else:
+                    parent['peak'] = max(parent['peak'], frame['peak'])
+                peak_mb = frame['peak'] / 1024 ** 2
+                stats['peak_mb'] = max(stats['peak_mb'] or 0.0, peak_mb)
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['max_rss_growth_mb'] += (rss_after - rss_before) / 1024
+            stats['workers_max_rss_mb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+            print(f"{'  ' * (len(self._stack) + 1)}{name}: {seconds:.2f}s"
+                  + (f", peak {peak_mb:.1f} MB" if peak_mb is not None else ''))
+
+    def instrument(self, obj, method_name: str, phase_name: Optional[str] = None):
+        """Profile every call of obj.method_name as a phase"""
+        method = getattr(obj, method_name)
+
+        @functools.wraps(method)
+        def profiled(*args, **kwargs):
+            with self.phase(phase_name or method_name):
+                return method(*args, **kwargs)
+
+        setattr(obj, method_name, profiled)
+
+
+def summarize_fits(tasks: List[Dict]) -> Dict[str, Dict]:
+    """Per-model holdout vs CV fold fit times from the scheduler's task report
+
+    Fold fit times include the in-fold resampling and scaling pipeline steps.
+    """
+    fits = {}
+    for task in tasks:
+        summary = fits.setdefault(task['model'], {
+            'holdout_fit_seconds': 0.0, 'holdout_predict_seconds': 0.0,
+            'folds': 0, 'fold_fit_seconds': 0.0, 'fold_predict_seconds': 0.0, 'cpu_seconds': 0.0
+        })
+        if task['fold'] is None:
+            summary['holdout_fit_seconds'] += task['fit_seconds']
+            summary['holdout_predict_seconds'] += task['predict_seconds']
+        else:
+            summary['folds'] += 1
+            summary['fold_fit_seconds'] += task['fit_seconds']
+            summary['fold_predict_seconds'] += task['predict_seconds']
+        summary['cpu_seconds'] += task['cpu_seconds']
+    for summary in fits.values():
+        summary['mean_fold_fit_seconds'] = summary['fold_fit_seconds'] / summary['folds'] if summary['folds'] else 0.0
+    return fits
+
+
+def run_benchmark(n_rows: int, seed: int, work_dir: Path, models: List[str], cv_folds: int,
+                  dense: bool, trace_memory: bool, imbalance_strategies: List[str] = (),
+                  search: str = 'halving', search_budget: float = 60, cores: Optional[int] = None) -> Dict:
+    """Run the trainer's own training pipeline once on synthetic data of the given size"""
+    from sklearn.base import clone
+    from sklearn.metrics import f1_score
+
+    module = load_trainer_module()
+
+    data_file = work_dir / f"expenses_{n_rows}_{seed}.csv"
+    if not data_file.exists():
+        print(f"Generating {n_rows} synthetic expenses (seed={seed})...")
+        generate_expenses(n_rows, seed).to_csv(data_file, index=False)
+
+    tracker = ExperimentTracker(
+        'expense-categorization-benchmark', fallback_dir=str(work_dir / 'mlruns'), log_models='all'
+    )
+    trainer = module.ExpenseCategorizationTrainer(
+        str(data_file), str(work_dir / 'models'), sparse_features=not dense, core_budget=cores, tracker=tracker
+    )
+    trainer.random_state = seed
+    trainer.cv_folds = cv_folds
+    trainer.models = {name: trainer.models[name] for name in models}
+
+    # Time what train() actually runs, down to the feature and resampling steps
+    profiler = PhaseProfiler(trace_memory)
+    for method_name in ('load_data', 'load_or_build_datasets', 'prepare_datasets', 'train_models',
+                        'hyperparameter_tuning', 'save_model'):
+        profiler.instrument(trainer, method_name)
+    profiler.instrument(module, 'build_feature_frame', 'derive_features')
+    profiler.instrument(trainer, 'fit_text_vectorizer', 'tfidf')
+    profiler.instrument(module, 'combine_features', 'combine_features')  # includes densifying with --dense
+    profiler.instrument(trainer, 'resample_training_set', 'resample')
+    profiler.instrument(trainer, 'scale_datasets', 'scale')
+    profiler.instrument(tracker, 'flush', 'mlflow_flush')
+
+    print(f"Benchmarking {n_rows} rows ({'dense' if dense else 'sparse'} features)...")
+    trainer.train(search=search, time_budget=search_budget)
+    tracker.close()
+    datasets = trainer.datasets
+
+    # Alternative imbalance strategies against today's SMOTE, on the trainer's split
+    imbalance = {}
+    for strategy in imbalance_strategies:
+        sampler = make_sampler(strategy, random_state=seed)
+        X_train, y_train = datasets['X_train'], datasets['y_train']
+        with profiler.phase(f'imbalance:{strategy}:resample'):
+            X_res, y_res = sampler.fit_resample(X_train, y_train) if sampler is not None else (X_train, y_train)
+            weights = balanced_sample_weight(strategy, y_res)
+        scaler = clone(trainer.scaler)
+        X_res = scaler.fit_transform(X_res)
+        X_eval = scaler.transform(datasets['X_test'])
+        imbalance[strategy] = {'train_rows': int(X_res.shape[0]), 'macro_f1': {}}
+        for name in models:
+            model = clone(trainer.models[name])
+            with profiler.phase(f'imbalance:{strategy}:fit:{name}'):
+                model.fit(X_res, y_res, sample_weight=weights)
+            imbalance[strategy]['macro_f1'][name] = float(
+                f1_score(datasets['y_test'], model.predict(X_eval), average='macro')
+            )
+
+    return {
+        'rows': n_rows,
+        'seed': seed,
+        'dense': dense,
+        'models': models,
+        'cv_folds': cv_folds,
+        'search': search,
+        'train_rows_after_resampling': int(len(datasets['y_train_balanced'])),
+        'feature_count': int(datasets['X_train'].shape[1]),
+        'best_accuracy': float(trainer.best_score),
+        'schedule': {
+            **{k: trainer.training_report[k] for k in ('core_budget', 'wall_seconds', 'cpu_seconds', 'core_utilization')},
+            'fits': summarize_fits(trainer.training_report['tasks'])
+        },
+        'imbalance': imbalance,
+        'phases': profiler.phases
+    }
+
+
+def compare_to_baseline(report: Dict, baseline: Dict, max_regression: float,
+                        min_seconds: float = 0.5) -> List[str]:
+    """List phases that regressed beyond the allowed fraction"""
+    regressions = []
+    for size, result in report['results'].items():
+        baseline_phases = baseline.get('results', {}).get(size, {}).get('phases', {})
+        for phase, metrics in result['phases'].items():
+            reference = baseline_phases.get(phase)
+            if not reference:
+                continue
+            # Very short phases are dominated by noise
+            if reference['seconds'] >= min_seconds and \
+                    metrics['seconds'] > reference['seconds'] * (1 + max_regression):
+                regressions.append(
+                    f"{size} {phase}: {metrics['seconds']:.2f}s vs baseline {reference['seconds']:.2f}s"
+                )
+            if metrics.get('peak_mb') and reference.get('peak_mb') and \
+                    metrics['peak_mb'] > reference['peak_mb'] * (1 + max_regression):
+                regressions.append(
+                    f"{size} {phase}: {metrics['peak_mb']:.1f} MB vs baseline {reference['peak_mb']:.1f} MB"
+                )
+    return regressions
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark expense categorization training phases')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['10k', '100k'],
+                        help='Synthetic dataset sizes to benchmark')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for data generation and splits')
+    parser.add_argument('--models', nargs='+', default=['logistic_regression', 'lightgbm'],
+                        help='Trainer models to fit')
+    parser.add_argument('--cv-folds', type=int, default=3, help='Cross-validation folds (0 to skip)')
+    parser.add_argument('--search', choices=['halving', 'grid'], default='halving',
+                        help='Hyperparameter search strategy')
+    parser.add_argument('--search-budget', type=float, default=60,
+                        help='Wall-clock seconds per model for halving search')
+    parser.add_argument('--cores', type=int, help='Core budget for the training scheduler (default: all)')
+    parser.add_argument('--dense', action='store_true', help='Benchmark the dense feature path')
+    parser.add_argument('--imbalance-strategies', nargs='+', choices=IMBALANCE_STRATEGIES, default=[],
+                        help='Also profile these imbalance strategies and report their macro-F1')
+    parser.add_argument('--no-trace-memory', action='store_true',
+                        help='Skip tracemalloc (removes its overhead from timings)')
+    parser.add_argument('--work-dir', help='Directory for generated data, models and the MLflow store')
+    parser.add_argument('--output', default='benchmark_report.json', help='Report output path')
+    parser.add_argument('--baseline', help='Baseline report to gate regressions against')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='Allowed fractional slowdown or memory growth per phase')
+
+    args = parser.parse_args()
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix='expense-benchmark-'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    # Keep MLflow offline
+    os.environ['MLFLOW_TRACKING_URI'] = (work_dir / 'mlruns').resolve().as_uri()
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'results': {}
+    }
+
+    for size in args.sizes:
+        report['results'][size] = run_benchmark(
+            SIZES[size], args.seed, work_dir, args.models, args.cv_folds,
+            args.dense, not args.no_trace_memory, args.imbalance_strategies,
+            args.search, args.search_budget, args.cores
+        )
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.max_regression)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Expense Categorization Dataset Cache
+Content-addressed on-disk cache of preprocessed, split and resampled training
+datasets so repeated training runs skip straight to fitting.
+
+Entries are keyed by a hash of the input data, the vectorizer configuration
+and the split/resampling settings. Arrays are stored as raw .npy files (CSR
+matrices as their data/indices/indptr arrays) and loaded memory-mapped.
+"""
+
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Tuple
+
+import joblib
+from scipy import sparse
+
+
+class DatasetCache:
+    def __init__(self, cache_dir: str = "cache/datasets"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, df: pd.DataFrame, config: Dict) -> str:
+        """Hash the input rows together with the dataset configuration"""
+        digest = hashlib.sha256()
+        digest.update(','.join(map(str, df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+        return digest.hexdigest()[:32]
+
+    def exists(self, key: str) -> bool:
+        return (self.cache_dir / key / 'manifest.json').exists()
+
+    def save(self, key: str, arrays: Dict, state: Dict, config: Dict):
+        """Persist arrays and fitted preprocessing state under a cache key"""
+        entry_dir = self.cache_dir / key
+        tmp_dir = self.cache_dir / f".{key}.tmp"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+
+        manifest = {'arrays': {}, 'config': config, 'created_at': datetime.now().isoformat()}
+        for name, array in arrays.items():
+            if sparse.issparse(array):
+                array = array.tocsr()
+                np.save(tmp_dir / f"{name}.data.npy", array.data)
+                np.save(tmp_dir / f"{name}.indices.npy", array.indices)
+                np.save(tmp_dir / f"{name}.indptr.npy", array.indptr)
+                manifest['arrays'][name] = {'sparse': True, 'shape': list(array.shape)}
+            else:
+                np.save(tmp_dir / f"{name}.npy", np.asarray(array))
+                manifest['arrays'][name] = {'sparse': False, 'shape': list(np.shape(array))}
+
+        joblib.dump(state, tmp_dir / 'state.joblib')
+        with open(tmp_dir / 'manifest.json', 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+
+        # Publish atomically so readers never see a partial entry
+        if entry_dir.exists():
+            shutil.rmtree(entry_dir)
+        tmp_dir.rename(entry_dir)
+
+    def load(self, key: str) -> Tuple[Dict, Dict]:
+        """Load memory-mapped arrays and preprocessing state for a cache key"""
+        entry_dir = self.cache_dir / key
+        with open(entry_dir / 'manifest.json', 'r') as f:
+            manifest = json.load(f)
+
+        arrays = {}
+        for name, info in manifest['arrays'].items():
+            if info['sparse']:
+                arrays[name] = sparse.csr_matrix(
+                    (
+                        np.load(entry_dir / f"{name}.data.npy", mmap_mode='r'),
+                        np.load(entry_dir / f"{name}.indices.npy", mmap_mode='r'),
+                        np.load(entry_dir / f"{name}.indptr.npy", mmap_mode='r')
+                    ),
+                    shape=tuple(info['shape'])
+                )
+            else:
+                arrays[name] = np.load(entry_dir / f"{name}.npy", mmap_mode='r')
+
+        state = joblib.load(entry_dir / 'state.joblib')
+        return arrays, state
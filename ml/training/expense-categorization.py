@@ -9,17 +9,22 @@ import pandas as pd
 import numpy as np
 import pickle
 import json
+import time
+import copy
+import tracemalloc
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Sequence, Tuple, Optional
 
-from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
 from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
+from sklearn.model_selection import train_test_split, GridSearchCV, ParameterSampler
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier, PassiveAggressiveClassifier
 from sklearn.svm import SVC
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
+from sklearn.metrics import classification_report, confusion_matrix, accuracy_score, f1_score
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import FunctionTransformer
@@ -30,30 +35,59 @@ from imblearn.over_sampling import SMOTE
 from imblearn.under_sampling import RandomUnderSampler
 from imblearn.pipeline import Pipeline as ImbPipeline
 
-import mlflow
-import mlflow.sklearn
-import mlflow.xgboost
-import mlflow.lightgbm
+from expense_features import (
+    FeatureMatrix, NUMERIC_SOURCE_COLUMNS, build_feature_frame, numeric_feature_frame, combine_features
+)
+from feature_store import FeatureStore
+from model_export import EXPORT_FORMATS, export_paths, write_format, benchmark_format, load_format, median_latency_ms
+from dataset_cache import DatasetCache
+from training_scheduler import TrainingScheduler
+from imbalance import IMBALANCE_STRATEGIES, make_sampler, balanced_sample_weight
+from tracking import ExperimentTracker
 
-# Configure MLflow
-mlflow.set_tracking_uri("http://localhost:5000")
-mlflow.set_experiment("expense-categorization")
+# Raw columns the trainer reads back from the feature store
+STORE_RAW_COLUMNS = ['description', 'amount', 'category', 'date', 'vendor', 'created_at']
 
 class ExpenseCategorizationTrainer:
-    def __init__(self, data_path: str, model_path: str = "models/"):
+    def __init__(self, data_path: str, model_path: str = "models/", sparse_features: bool = True,
+                 cache_dir: Optional[str] = None, core_budget: Optional[int] = None,
+                 tracker: Optional[ExperimentTracker] = None, imbalance: str = 'smote',
+                 feature_store: Optional[FeatureStore] = None, start_date: Optional[datetime] = None,
+                 end_date: Optional[datetime] = None):
         self.data_path = data_path
         self.model_path = Path(model_path)
         self.model_path.mkdir(exist_ok=True)
         
+        # Split/resampling settings shared by every training stage
+        self.test_size = 0.2
+        self.random_state = 42
+        self.cv_folds = 5
+        if imbalance not in IMBALANCE_STRATEGIES:
+            raise ValueError(f"Unsupported imbalance strategy: {imbalance}")
+        self.imbalance = imbalance
+        self.imbalance_options = {'max_ratio': 3.0, 'n_components': 100}
+        self.dataset_cache = DatasetCache(cache_dir) if cache_dir else None
+        
+        # ETL-written features replace raw CSV loading when a store is given
+        self.feature_store = feature_store
+        self.feature_date_range = (start_date, end_date)
+        self.datasets = None
+        self._datasets_source = None
+        
+        # Packs (model, fold) fits onto a process pool under a core budget
+        self.scheduler = TrainingScheduler(core_budget, shared_dir=cache_dir)
+        
+        # MLflow is configured lazily and logged to from a background thread
+        self.tracker = tracker or ExperimentTracker()
+        self.training_report = None
+        
+        # Out-of-fold predictions per model, reusable for stacking/calibration
+        self.oof_predictions = {}
+        self.oof_targets = None
+        
         # Initialize components
-        self.text_vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            ngram_range=(1, 2),
-            min_df=2
-        )
+        self.configure_feature_path(sparse_features)
         self.label_encoder = LabelEncoder()
-        self.scaler = StandardScaler()
         
         # Model configurations
         self.models = {
@@ -70,6 +104,7 @@ class ExpenseCategorizationTrainer:
                 random_state=42
             ),
             'logistic_regression': LogisticRegression(
+                solver=self.logistic_solver(sparse_features),
                 max_iter=1000,
                 random_state=42,
                 n_jobs=-1
@@ -91,16 +126,97 @@ class ExpenseCategorizationTrainer:
             )
         }
         
+        # Define parameter grids for different models
+        self.param_grids = {
+            'random_forest': {
+                'n_estimators': [50, 100, 200],
+                'max_depth': [5, 10, 15, None],
+                'min_samples_split': [2, 5, 10],
+                'min_samples_leaf': [1, 2, 4]
+            },
+            'xgboost': {
+                'n_estimators': [50, 100, 200],
+                'learning_rate': [0.01, 0.1, 0.2],
+                'max_depth': [3, 6, 9],
+                'subsample': [0.8, 0.9, 1.0]
+            },
+            'lightgbm': {
+                'n_estimators': [50, 100, 200],
+                'learning_rate': [0.01, 0.1, 0.2],
+                'max_depth': [3, 6, 9],
+                'subsample': [0.8, 0.9, 1.0]
+            }
+        }
+        
+        # Compact students for low-latency distillation
+        self.student_models = {
+            'logistic_regression': LogisticRegression(
+                solver='saga',
+                penalty='l1',  # sparse coefficients keep the student small
+                C=1.0,
+                max_iter=200,
+                random_state=42
+            ),
+            'lightgbm': lgb.LGBMClassifier(
+                n_estimators=50,
+                num_leaves=15,
+                max_depth=4,
+                learning_rate=0.1,
+                random_state=42,
+                n_jobs=1,
+                verbose=-1
+            )
+        }
+        
+        # Incremental learners for out-of-core training
+        self.streaming_models = {
+            'sgd': SGDClassifier(
+                loss='log_loss',
+                alpha=1e-5,
+                random_state=42
+            ),
+            'passive_aggressive': PassiveAggressiveClassifier(
+                C=0.1,
+                random_state=42
+            )
+        }
+        
         self.best_model = None
+        self.best_model_name = None
         self.best_score = 0
+        self.student_model = None
         self.feature_names = []
+        self.numeric_columns = []
+        self.text_feature_count = 0
+        self.amount_bin_edges = None
+    
+    def configure_feature_path(self, sparse_features: bool):
+        """Select the sparse float32 or the legacy dense float64 feature path"""
+        self.sparse_features = sparse_features
+        self.feature_dtype = np.float32 if sparse_features else np.float64
+        self.text_vectorizer = TfidfVectorizer(
+            max_features=1000,
+            stop_words='english',
+            ngram_range=(1, 2),
+            min_df=2,
+            dtype=self.feature_dtype
+        )
+        # Centering would densify a sparse matrix, so only scale by variance
+        self.scaler = StandardScaler(with_mean=not sparse_features)
+        if 'logistic_regression' in getattr(self, 'models', {}):
+            self.models['logistic_regression'].set_params(solver=self.logistic_solver(sparse_features))
+    
+    @staticmethod
+    def logistic_solver(sparse_features: bool) -> str:
+        """saga keeps float32 sparse input without a float64 copy; the legacy dense path keeps lbfgs"""
+        return 'saga' if sparse_features else 'lbfgs'
         
     def load_data(self) -> pd.DataFrame:
         """Load and preprocess expense data"""
         print("Loading expense data...")
         
         # Load data from CSV or database
-        if self.data_path.endswith('.csv'):
+        if self.data_path and self.data_path.endswith('.csv'):
             df = pd.read_csv(self.data_path)
         else:
             # Load from database (implement based on your database)
@@ -109,118 +225,220 @@ class ExpenseCategorizationTrainer:
         print(f"Loaded {len(df)} expense records")
         return df
     
-    def preprocess_data(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    def preprocess_data(self, df: pd.DataFrame) -> Tuple[FeatureMatrix, np.ndarray]:
         """Preprocess the data for training"""
         print("Preprocessing data...")
         
         # Clean and prepare features
         df = df.dropna(subset=['description', 'category'])
+        text_features, numeric_features, self.amount_bin_edges = build_feature_frame(df)
         
-        # Text preprocessing
-        df['description_clean'] = df['description'].str.lower().str.strip()
-        
-        # Feature engineering
-        df['amount_log'] = np.log1p(df['amount'])
-        df['amount_binned'] = pd.cut(df['amount'], bins=10, labels=False)
-        df['description_length'] = df['description'].str.len()
-        df['word_count'] = df['description'].str.split().str.len()
+        # Vectorize text features and combine; features stay CSR unless --dense
+        X_text = self.fit_text_vectorizer(text_features)
+        X = combine_features(X_text, numeric_features, self.feature_dtype, self.sparse_features)
         
-        # Date features
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-            df['month'] = df['date'].dt.month
-            df['day_of_week'] = df['date'].dt.dayofweek
-            df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-        
-        # Vendor features
-        if 'vendor' in df.columns:
-            df['vendor_clean'] = df['vendor'].str.lower().str.strip()
-            df['vendor_length'] = df['vendor'].str.len()
+        # Encode target variable
+        y = self.label_encoder.fit_transform(df['category'])
         
-        # Prepare features and target
-        text_features = df['description_clean'].fillna('')
-        numeric_features = df[['amount_log', 'amount_binned', 'description_length', 'word_count']].fillna(0)
+        # Store feature names for later use
+        self.numeric_columns = list(numeric_features.columns)
+        self.text_feature_count = X_text.shape[1]
+        self.feature_names = (
+            list(self.text_vectorizer.get_feature_names_out()) + 
+            self.numeric_columns
+        )
         
-        if 'month' in df.columns:
-            numeric_features = pd.concat([numeric_features, df[['month', 'day_of_week', 'is_weekend']]], axis=1)
+        print(f"Feature matrix shape: {X.shape}")
+        print(f"Number of categories: {len(self.label_encoder.classes_)}")
         
-        if 'vendor_length' in df.columns:
-            numeric_features = pd.concat([numeric_features, df[['vendor_length']]], axis=1)
+        return X, y
+    
+    def fit_text_vectorizer(self, text_features: pd.Series) -> sparse.csr_matrix:
+        """Fit the TF-IDF vocabulary and vectorize the training descriptions"""
+        return self.text_vectorizer.fit_transform(text_features)
+    
+    def imbalance_sampler(self):
+        """Resampler for the configured imbalance strategy, None for cost-sensitive training"""
+        return make_sampler(self.imbalance, self.random_state, **self.imbalance_options)
+    
+    def load_store_features(self, start_date: Optional[datetime] = None,
+                            end_date: Optional[datetime] = None) -> Tuple[FeatureMatrix, np.ndarray]:
+        """Load ETL-written features for a date range instead of re-deriving them"""
+        print(f"Loading features from feature store version {self.feature_store.version}...")
         
-        # Vectorize text features
-        X_text = self.text_vectorizer.fit_transform(text_features)
-        X_numeric = numeric_features.values
+        # Only the columns the model needs, only the partitions in range
+        table = self.feature_store.read(
+            start_date, end_date,
+            columns=['category', *NUMERIC_SOURCE_COLUMNS, 'text_indices', 'text_values'],
+            labelled_only=True
+        )
+        if table.num_rows == 0:
+            raise ValueError(
+                f"No labelled rows in feature store version {self.feature_store.version} "
+                f"between {start_date or 'the first'} and {end_date or 'the last'} expense date"
+            )
+        df = table.drop(['text_indices', 'text_values']).to_pandas()
+        labelled = df['category'].notna().values
+        df = df[labelled]
+        X_counts = self.feature_store.text_matrix(table)[labelled]
         
-        # Combine features
-        X = np.hstack([X_text.toarray(), X_numeric])
+        # IDF weighting over the stored term counts; with the store's hashing
+        # vectorizer it forms the saved text pipeline
+        tfidf = TfidfTransformer()
+        X_text = tfidf.fit_transform(X_counts).astype(self.feature_dtype)
+        self.text_vectorizer = Pipeline([('hashing', self.feature_store.text_vectorizer), ('tfidf', tfidf)])
         
-        # Encode target variable
+        numeric_features, self.amount_bin_edges = numeric_feature_frame(df)
+        X = combine_features(X_text, numeric_features, self.feature_dtype, self.sparse_features)
         y = self.label_encoder.fit_transform(df['category'])
         
-        # Store feature names for later use
-        self.feature_names = (
-            list(self.text_vectorizer.get_feature_names_out()) + 
-            list(numeric_features.columns)
-        )
+        # Hashed text columns have no names
+        self.numeric_columns = list(numeric_features.columns)
+        self.text_feature_count = X_text.shape[1]
+        self.feature_names = list(self.numeric_columns)
         
+        print(f"Loaded {X.shape[0]} labelled expenses from the feature store")
         print(f"Feature matrix shape: {X.shape}")
         print(f"Number of categories: {len(self.label_encoder.classes_)}")
         
         return X, y
     
-    def train_models(self, X: np.ndarray, y: np.ndarray) -> Dict[str, float]:
-        """Train multiple models and select the best one"""
-        print("Training models...")
+    def prepare_datasets(self, X: FeatureMatrix, y: np.ndarray) -> Dict[str, FeatureMatrix]:
+        """Split, balance and scale the data once per feature matrix"""
+        if self.datasets is not None and self._datasets_source is X:
+            return self.datasets
         
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
+            X, y, test_size=self.test_size, random_state=self.random_state, stratify=y
         )
         
-        # Handle class imbalance
-        smote = SMOTE(random_state=42)
-        X_train_balanced, y_train_balanced = smote.fit_resample(X_train, y_train)
+        X_train_balanced, y_train_balanced = self.resample_training_set(X_train, y_train)
+        sample_weight = balanced_sample_weight(self.imbalance, y_train_balanced)
+        X_train_scaled, X_test_scaled = self.scale_datasets(X_train_balanced, X_test)
         
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train_balanced)
-        X_test_scaled = self.scaler.transform(X_test)
+        self.datasets = {
+            'X_train': X_train,
+            'X_test': X_test,
+            'y_train': y_train,
+            'y_test': y_test,
+            'X_train_balanced': X_train_balanced,
+            'y_train_balanced': y_train_balanced,
+            'X_train_scaled': X_train_scaled,
+            'X_test_scaled': X_test_scaled
+        }
+        if sample_weight is not None:
+            self.datasets['sample_weight'] = sample_weight
+        self._datasets_source = X
+        return self.datasets
+    
+    def resample_training_set(self, X_train: FeatureMatrix, y_train: np.ndarray) -> Tuple[FeatureMatrix, np.ndarray]:
+        """Handle class imbalance by resampling, or leave rows as-is when weighting instead"""
+        sampler = self.imbalance_sampler()
+        if sampler is None:
+            return X_train, y_train
+        return sampler.fit_resample(X_train, y_train)
+    
+    def scale_datasets(self, X_train: FeatureMatrix, X_test: FeatureMatrix) -> Tuple[FeatureMatrix, FeatureMatrix]:
+        """Fit the scaler on the training rows and scale both splits"""
+        return self.scaler.fit_transform(X_train), self.scaler.transform(X_test)
+    
+    def dataset_config(self) -> Dict:
+        """Settings that determine the cached feature matrix and splits"""
+        return {
+            'vectorizer': self.text_vectorizer.__class__.__name__,
+            'vectorizer_params': self.text_vectorizer.get_params(),
+            'sparse_features': self.sparse_features,
+            'test_size': self.test_size,
+            'random_state': self.random_state,
+            'imbalance': self.imbalance,
+            'imbalance_options': self.imbalance_options,
+            'scaler_params': self.scaler.get_params()
+        }
+    
+    def load_or_build_datasets(self, df: pd.DataFrame) -> Tuple[FeatureMatrix, np.ndarray]:
+        """Reuse cached features and splits for identical inputs, else build and cache them"""
+        if self.dataset_cache is None:
+            return self.preprocess_data(df)
+        
+        config = self.dataset_config()
+        key = self.dataset_cache.key(df, config)
+        
+        if self.dataset_cache.exists(key):
+            print(f"Loading cached datasets ({key})...")
+            arrays, state = self.dataset_cache.load(key)
+            for name, value in state.items():
+                setattr(self, name, value)
+            X, y = arrays.pop('X'), arrays.pop('y')
+            self.datasets = arrays
+            self._datasets_source = X
+            print(f"Feature matrix shape: {X.shape}")
+            return X, y
+        
+        X, y = self.preprocess_data(df)
+        datasets = self.prepare_datasets(X, y)
+        state = {
+            'text_vectorizer': self.text_vectorizer,
+            'label_encoder': self.label_encoder,
+            'scaler': self.scaler,
+            'feature_names': self.feature_names,
+            'numeric_columns': self.numeric_columns,
+            'text_feature_count': self.text_feature_count,
+            'amount_bin_edges': self.amount_bin_edges
+        }
+        self.dataset_cache.save(key, {'X': X, 'y': y, **datasets}, state, config)
+        print(f"Cached datasets ({key})")
+        return X, y
+    
+    def train_models(self, X: FeatureMatrix, y: np.ndarray) -> Dict[str, float]:
+        """Train multiple models and select the best one"""
+        print("Training models...")
+        
+        # Split, balance and scale once; reused across stages
+        datasets = self.prepare_datasets(X, y)
+        y_test = datasets['y_test']
         
         results = {}
         
-        with mlflow.start_run():
-            for name, model in self.models.items():
-                print(f"Training {name}...")
-                
-                # Train model
-                model.fit(X_train_scaled, y_train_balanced)
-                
-                # Predict and evaluate
-                y_pred = model.predict(X_test_scaled)
-                accuracy = accuracy_score(y_test, y_pred)
+        print(f"Scheduling fits on {self.scheduler.core_budget} cores ({self.imbalance} imbalance handling)...")
+        task_results, self.training_report = self.schedule_fits(self.models, datasets)
+        self.oof_targets = datasets['y_train']
+        print(
+            f"Scheduled fits finished in {self.training_report['wall_seconds']:.1f}s "
+            f"({self.training_report['core_utilization']:.0%} core utilization)"
+        )
+        
+        with self.tracker.run():
+            self.tracker.log_text(json.dumps(self.training_report, indent=2, default=str), "training_schedule.json")
+            self.tracker.log_metric("core_utilization", self.training_report['core_utilization'])
+            self.tracker.log_param("imbalance", self.imbalance)
+            
+            best_name = None
+            for name in self.models:
+                model = task_results[name]['estimator']
+                self.models[name] = model
+                accuracy = task_results[name]['accuracy']
+                cv_mean = task_results[name]['cv_mean']
+                cv_std = task_results[name]['cv_std']
+                oof_accuracy = accuracy_score(self.oof_targets, task_results[name]['oof_pred'])
                 
-                # Cross-validation score
-                cv_scores = cross_val_score(model, X_train_scaled, y_train_balanced, cv=5)
-                cv_mean = cv_scores.mean()
-                cv_std = cv_scores.std()
+                self.store_oof_predictions(name, task_results[name])
                 
                 results[name] = {
                     'accuracy': accuracy,
                     'cv_mean': cv_mean,
-                    'cv_std': cv_std
+                    'cv_std': cv_std,
+                    'oof_accuracy': oof_accuracy
                 }
                 
                 # Log metrics to MLflow
-                mlflow.log_metric(f"{name}_accuracy", accuracy)
-                mlflow.log_metric(f"{name}_cv_mean", cv_mean)
-                mlflow.log_metric(f"{name}_cv_std", cv_std)
+                self.tracker.log_metric(f"{name}_accuracy", accuracy)
+                self.tracker.log_metric(f"{name}_cv_mean", cv_mean)
+                self.tracker.log_metric(f"{name}_cv_std", cv_std)
+                self.tracker.log_metric(f"{name}_oof_accuracy", oof_accuracy)
                 
-                # Log model
-                if name == 'xgboost':
-                    mlflow.xgboost.log_model(model, f"{name}_model")
-                elif name == 'lightgbm':
-                    mlflow.lightgbm.log_model(model, f"{name}_model")
-                else:
-                    mlflow.sklearn.log_model(model, f"{name}_model")
+                # Log candidate model (only uploaded with log_models='all')
+                self.tracker.log_model(model, f"{name}_model")
                 
                 print(f"{name} - Accuracy: {accuracy:.4f}, CV: {cv_mean:.4f} (+/- {cv_std:.4f})")
                 
@@ -228,60 +446,94 @@ class ExpenseCategorizationTrainer:
                 if accuracy > self.best_score:
                     self.best_score = accuracy
                     self.best_model = model
+                    self.best_model_name = name
+                    best_name = name
             
-            # Log best model
-            mlflow.log_metric("best_accuracy", self.best_score)
-            mlflow.log_param("best_model", self.best_model.__class__.__name__)
+            # The best model itself is logged by log_best_model once tuning has settled it
+            best_name = best_name or max(results, key=lambda n: results[n]['accuracy'])
             
-            # Log classification report
-            y_pred_best = self.best_model.predict(X_test_scaled)
-            report = classification_report(y_test, y_pred_best, output_dict=True)
-            mlflow.log_text(json.dumps(report, indent=2), "classification_report.json")
+            # Log classification reports from the cached holdout and out-of-fold predictions
+            report = classification_report(y_test, self.oof_predictions[best_name]['test_pred'], output_dict=True)
+            self.tracker.log_text(json.dumps(report, indent=2), "classification_report.json")
+            oof_report = classification_report(
+                self.oof_targets, self.oof_predictions[best_name]['y_pred'], output_dict=True
+            )
+            self.tracker.log_text(json.dumps(oof_report, indent=2), "oof_classification_report.json")
+        
+        self.save_oof_predictions()
         
         return results
     
-    def hyperparameter_tuning(self, X: np.ndarray, y: np.ndarray) -> Dict[str, any]:
-        """Perform hyperparameter tuning for the best model"""
-        print("Performing hyperparameter tuning...")
-        
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
+    def log_best_model(self):
+        """Log the final best model after tuning and refitting have settled it"""
+        with self.tracker.run("best_model"):
+            self.tracker.log_param("best_model", self.best_model.__class__.__name__)
+            self.tracker.log_param("best_model_name", self.best_model_name)
+            self.tracker.log_metric("best_accuracy", self.best_score)
+            self.tracker.log_model(self.best_model, f"{self.best_model_name}_model", selected=True)
+    
+    def schedule_fits(self, models: Dict, datasets: Dict[str, FeatureMatrix]) -> Tuple[Dict, Dict]:
+        """Run the holdout fit and every CV fold of each model as parallel scheduler tasks"""
+        # CV folds use the raw training rows and resample (or weight) and scale
+        # inside each fold, so synthetic neighbours never leak across folds.
+        sampler = self.imbalance_sampler()
+        fold_steps = [('scaler', StandardScaler(with_mean=not self.sparse_features))]
+        if sampler is not None:
+            fold_steps.insert(0, ('resampler', sampler))
+        return self.scheduler.run(
+            models, datasets['X_train_scaled'], datasets['y_train_balanced'],
+            datasets['X_test_scaled'], datasets['y_test'],
+            X_cv=datasets['X_train'], y_cv=datasets['y_train'], fold_steps=fold_steps, cv=self.cv_folds,
+            sample_weight=datasets.get('sample_weight'), fold_weighting=sampler is None
         )
+    
+    def store_oof_predictions(self, name: str, task_result: Dict):
+        """Cache one model's out-of-fold and holdout predictions from a scheduler result"""
+        self.oof_predictions[name] = {
+            'y_pred': task_result['oof_pred'],
+            'y_proba': task_result['oof_proba'],
+            'fold': task_result['oof_fold'],
+            'test_pred': task_result['y_pred']
+        }
+    
+    def save_oof_predictions(self, filename: str = "oof_predictions.npz"):
+        """Persist cached out-of-fold predictions for stacking and calibration"""
+        arrays = {'y_true': self.oof_targets}
+        for name, cached in self.oof_predictions.items():
+            for key, values in cached.items():
+                arrays[f"{name}__{key}"] = values
         
-        # Handle class imbalance
-        smote = SMOTE(random_state=42)
-        X_train_balanced, y_train_balanced = smote.fit_resample(X_train, y_train)
+        oof_file = self.model_path / filename
+        np.savez(oof_file, **arrays)
+        print(f"Out-of-fold predictions saved to {oof_file}")
+    
+    def load_oof_predictions(self, filename: str = "oof_predictions.npz") -> Dict[str, Dict[str, np.ndarray]]:
+        """Load out-of-fold predictions saved by a previous train_models run"""
+        with np.load(self.model_path / filename) as data:
+            self.oof_targets = data['y_true']
+            self.oof_predictions = {}
+            for key in data.files:
+                if key == 'y_true':
+                    continue
+                name, field = key.split('__', 1)
+                self.oof_predictions.setdefault(name, {})[field] = data[key]
+        return self.oof_predictions
+    
+    def hyperparameter_tuning(self, X: FeatureMatrix, y: np.ndarray, search: str = 'grid',
+                              time_budget: float = 600) -> Dict[str, any]:
+        """Perform hyperparameter tuning for the best model"""
+        if search == 'halving':
+            return self.successive_halving_tuning(X, y, time_budget)
         
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train_balanced)
-        X_test_scaled = self.scaler.transform(X_test)
+        print("Performing hyperparameter tuning...")
         
-        # Define parameter grids for different models
-        param_grids = {
-            'random_forest': {
-                'n_estimators': [50, 100, 200],
-                'max_depth': [5, 10, 15, None],
-                'min_samples_split': [2, 5, 10],
-                'min_samples_leaf': [1, 2, 4]
-            },
-            'xgboost': {
-                'n_estimators': [50, 100, 200],
-                'learning_rate': [0.01, 0.1, 0.2],
-                'max_depth': [3, 6, 9],
-                'subsample': [0.8, 0.9, 1.0]
-            },
-            'lightgbm': {
-                'n_estimators': [50, 100, 200],
-                'learning_rate': [0.01, 0.1, 0.2],
-                'max_depth': [3, 6, 9],
-                'subsample': [0.8, 0.9, 1.0]
-            }
-        }
+        # Split, balance and scale once; reused across stages
+        datasets = self.prepare_datasets(X, y)
+        X_train_scaled, y_train_balanced = datasets['X_train_scaled'], datasets['y_train_balanced']
         
         best_params = {}
         
-        for model_name, param_grid in param_grids.items():
+        for model_name, param_grid in self.param_grids.items():
             if model_name in self.models:
                 print(f"Tuning hyperparameters for {model_name}...")
                 
@@ -289,7 +541,7 @@ class ExpenseCategorizationTrainer:
                 grid_search = GridSearchCV(
                     model, param_grid, cv=3, scoring='accuracy', n_jobs=-1
                 )
-                grid_search.fit(X_train_scaled, y_train_balanced)
+                grid_search.fit(X_train_scaled, y_train_balanced, sample_weight=datasets.get('sample_weight'))
                 
                 best_params[model_name] = grid_search.best_params_
                 print(f"{model_name} best params: {grid_search.best_params_}")
@@ -297,7 +549,350 @@ class ExpenseCategorizationTrainer:
         
         return best_params
     
-    def save_model(self, model_name: str = "expense_categorization_model"):
+    def fit_candidate(self, model_name: str, model, X_fit, y_fit, X_val, y_val,
+                      early_stopping_rounds: int = 20, sample_weight: Optional[np.ndarray] = None):
+        """Fit one candidate, early-stopping boosted models on the validation set"""
+        if model_name == 'xgboost':
+            model.set_params(early_stopping_rounds=early_stopping_rounds)
+            model.fit(X_fit, y_fit, sample_weight=sample_weight, eval_set=[(X_val, y_val)], verbose=False)
+        elif model_name == 'lightgbm':
+            model.fit(
+                X_fit, y_fit, sample_weight=sample_weight, eval_set=[(X_val, y_val)],
+                callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)]
+            )
+        else:
+            model.fit(X_fit, y_fit, sample_weight=sample_weight)
+        return model
+    
+    def successive_halving_tuning(self, X: FeatureMatrix, y: np.ndarray, time_budget: float = 600,
+                                  n_candidates: int = 27, factor: int = 3,
+                                  max_boosting_rounds: int = 1000) -> Dict[str, any]:
+        """Budgeted successive-halving search that refits the winner into best_model"""
+        print(f"Performing successive-halving tuning ({time_budget:.0f}s budget per model)...")
+        
+        datasets = self.prepare_datasets(X, y)
+        
+        # Select on a validation split of the real (pre-resampling) training rows
+        X_search, X_val, y_search, y_val = train_test_split(
+            datasets['X_train'], datasets['y_train'], test_size=0.2,
+            random_state=self.random_state, stratify=datasets['y_train']
+        )
+        sampler = self.imbalance_sampler()
+        if sampler is not None:
+            X_search, y_search = sampler.fit_resample(X_search, y_search)
+        X_search, X_val = self.scaler.transform(X_search), self.scaler.transform(X_val)
+        
+        n_classes = len(np.unique(y_search))
+        n_rounds = int(np.ceil(np.log(n_candidates) / np.log(factor))) + 1
+        min_resources = max(n_classes * 10, X_search.shape[0] // factor ** (n_rounds - 1))
+        rng = np.random.RandomState(self.random_state)
+        
+        best_params = {}
+        tuned = {}
+        
+        for model_name, param_grid in self.param_grids.items():
+            if model_name not in self.models:
+                continue
+            print(f"Tuning hyperparameters for {model_name}...")
+            
+            deadline = time.perf_counter() + time_budget
+            is_boosting = model_name in ('xgboost', 'lightgbm')
+            space = {k: v for k, v in param_grid.items() if not (is_boosting and k == 'n_estimators')}
+            candidates = list(ParameterSampler(space, n_candidates, random_state=rng))
+            finished = None
+            
+            for round_idx in range(n_rounds):
+                n_resources = min(X_search.shape[0], min_resources * factor ** round_idx)
+                if n_resources < X_search.shape[0]:
+                    X_round, _, y_round, _ = train_test_split(
+                        X_search, y_search, train_size=n_resources,
+                        random_state=self.random_state, stratify=y_search
+                    )
+                else:
+                    X_round, y_round = X_search, y_search
+                w_round = balanced_sample_weight(self.imbalance, y_round)
+                
+                scores = {}
+                for idx, params in enumerate(candidates):
+                    if time.perf_counter() > deadline:
+                        break
+                    model = clone(self.models[model_name]).set_params(**params)
+                    if is_boosting:
+                        model.set_params(n_estimators=max_boosting_rounds)
+                    self.fit_candidate(model_name, model, X_round, y_round, X_val, y_val, sample_weight=w_round)
+                    scores[idx] = (accuracy_score(y_val, model.predict(X_val)), model)
+                
+                if not scores:
+                    break
+                
+                # Rank the candidates that finished within the budget
+                ranked = sorted(scores, key=lambda i: scores[i][0], reverse=True)
+                finished = (candidates[ranked[0]], *scores[ranked[0]])
+                print(f"  round {round_idx + 1}: {len(scores)} candidates on {n_resources} rows, best {finished[1]:.4f}")
+                
+                if len(ranked) == 1 or time.perf_counter() > deadline:
+                    break
+                # Promote the top 1/factor to the next, larger round
+                candidates = [candidates[i] for i in ranked[:max(1, len(ranked) // factor)]]
+            
+            if finished is None:
+                print(f"{model_name}: budget exhausted before any candidate finished")
+                continue
+            
+            params, val_score, fitted = dict(finished[0]), finished[1], finished[2]
+            if is_boosting:
+                # Lock in the early-stopped number of boosting rounds
+                best_iteration = getattr(fitted, 'best_iteration_', None) or getattr(fitted, 'best_iteration', None)
+                params['n_estimators'] = (best_iteration or max_boosting_rounds) + (1 if model_name == 'xgboost' else 0)
+            
+            best_params[model_name] = params
+            tuned[model_name] = val_score
+            print(f"{model_name} best params: {params}")
+            print(f"{model_name} best score: {val_score:.4f}")
+        
+        if not tuned:
+            return best_params
+        
+        # Refit the overall winner on the full balanced training set, rerunning its CV
+        # folds so the cached out-of-fold predictions match the tuned parameters
+        best_name = max(tuned, key=tuned.get)
+        tuned_model = clone(self.models[best_name]).set_params(**best_params[best_name])
+        task_results, _ = self.schedule_fits({best_name: tuned_model}, datasets)
+        model = task_results[best_name]['estimator']
+        self.models[best_name] = model
+        self.oof_targets = datasets['y_train']
+        self.store_oof_predictions(best_name, task_results[best_name])
+        self.save_oof_predictions()
+        
+        accuracy = task_results[best_name]['accuracy']
+        print(f"Refit tuned {best_name} - Accuracy: {accuracy:.4f}")
+        if accuracy >= self.best_score:
+            self.best_score = accuracy
+            self.best_model = model
+            self.best_model_name = best_name
+        
+        return best_params
+    
+    def iter_data_chunks(self, chunksize: int, usecols: Optional[List[str]] = None,
+                         added_after: Optional[datetime] = None):
+        """Yield expense data in bounded-size chunks"""
+        if self.feature_store is not None:
+            # Stream record batches with the label and added_after filters pushed down
+            start_date, end_date = self.feature_date_range
+            yield from self.feature_store.iter_batches(
+                chunksize, start_date, end_date, columns=usecols or STORE_RAW_COLUMNS,
+                labelled_only=True, added_after=added_after
+            )
+        elif self.data_path and self.data_path.endswith('.csv'):
+            yield from pd.read_csv(self.data_path, chunksize=chunksize, usecols=usecols)
+        else:
+            df = self.load_from_database()
+            if usecols is not None:
+                df = df[usecols]
+            for start in range(0, len(df), chunksize):
+                yield df.iloc[start:start + chunksize]
+    
+    def train_streaming(self, learner: str = 'sgd', chunksize: int = 100_000, epochs: int = 1,
+                        n_features: int = 2 ** 20, validation_fraction: float = 0.05,
+                        max_validation_rows: int = 100_000) -> Dict[str, float]:
+        """Train an incremental model out-of-core over chunked data"""
+        print(f"Streaming training with {learner} (chunksize={chunksize}, epochs={epochs})...")
+        
+        # Labels must be known up front for partial_fit; scan only that column
+        categories = set()
+        for chunk in self.iter_data_chunks(chunksize, usecols=['category']):
+            categories.update(chunk['category'].dropna().unique())
+        self.label_encoder.fit(sorted(categories))
+        classes = np.arange(len(self.label_encoder.classes_))
+        
+        # Stateless vectorizer: no vocabulary to fit or hold in memory
+        self.configure_feature_path(sparse_features=True)
+        self.text_vectorizer = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            dtype=self.feature_dtype
+        )
+        self.amount_bin_edges = None
+        
+        model = clone(self.streaming_models[learner])
+        validation_X, validation_y = [], []
+        validation_rows = 0
+        rows_seen = 0
+        
+        for epoch in range(epochs):
+            for chunk in self.iter_data_chunks(chunksize):
+                chunk = chunk.dropna(subset=['description', 'category'])
+                if chunk.empty:
+                    continue
+                
+                # Deterministic hash split keeps the holdout stable across epochs
+                row_hash = pd.util.hash_pandas_object(chunk[['description', 'amount']], index=False).values
+                is_validation = (row_hash % 10_000) < int(validation_fraction * 10_000)
+                
+                text_features, numeric_features, self.amount_bin_edges = build_feature_frame(
+                    chunk, self.amount_bin_edges
+                )
+                X_chunk = combine_features(
+                    self.text_vectorizer.transform(text_features), numeric_features, self.feature_dtype
+                )
+                y_chunk = self.label_encoder.transform(chunk['category'])
+                self.numeric_columns = list(numeric_features.columns)
+                
+                if epoch == 0 and is_validation.any() and validation_rows < max_validation_rows:
+                    take = np.flatnonzero(is_validation)[:max_validation_rows - validation_rows]
+                    validation_X.append(X_chunk[take])
+                    validation_y.append(y_chunk[take])
+                    validation_rows += len(take)
+                
+                train_mask = ~is_validation
+                if not train_mask.any():
+                    continue
+                
+                # Scale numeric columns with running statistics
+                X_train = X_chunk[train_mask]
+                self.scaler.partial_fit(X_train)
+                model.partial_fit(self.scaler.transform(X_train), y_chunk[train_mask], classes=classes)
+                rows_seen += int(train_mask.sum())
+            
+            print(f"Epoch {epoch + 1}/{epochs} complete ({rows_seen} training rows seen)")
+        
+        self.text_feature_count = n_features
+        self.feature_names = list(self.numeric_columns)
+        
+        results = {'training_rows': rows_seen, 'validation_rows': validation_rows}
+        if validation_rows:
+            X_val = sparse.vstack(validation_X, format='csr')
+            y_val = np.concatenate(validation_y)
+            accuracy = accuracy_score(y_val, model.predict(self.scaler.transform(X_val)))
+            results['accuracy'] = accuracy
+            print(f"{learner} - Streaming validation accuracy: {accuracy:.4f}")
+        else:
+            accuracy = 0
+        
+        self.best_model = model
+        self.best_model_name = learner
+        self.best_score = accuracy
+        
+        return results
+    
+    def compare_feature_paths(self, df: pd.DataFrame,
+                              model_name: str = 'logistic_regression') -> Dict[str, Dict[str, float]]:
+        """Compare peak memory and fit time of the sparse and dense feature paths"""
+        print(f"Comparing sparse and dense feature paths with {model_name}...")
+        
+        original_sparse = self.sparse_features
+        comparison = {}
+        
+        try:
+            for label, use_sparse in (('sparse', True), ('dense', False)):
+                self.configure_feature_path(use_sparse)
+                
+                # tracemalloc sees numpy/scipy buffers, not native model internals
+                tracemalloc.start()
+                start = time.perf_counter()
+                
+                X, y = self.preprocess_data(df.copy())
+                X_train, _, y_train, _ = train_test_split(
+                    X, y, test_size=0.2, random_state=42, stratify=y
+                )
+                X_train_balanced, y_train_balanced = SMOTE(random_state=42).fit_resample(X_train, y_train)
+                X_train_scaled = self.scaler.fit_transform(X_train_balanced)
+                prepare_seconds = time.perf_counter() - start
+                _, prepare_peak = tracemalloc.get_traced_memory()
+                
+                model = clone(self.models[model_name])
+                fit_start = time.perf_counter()
+                model.fit(X_train_scaled, y_train_balanced)
+                fit_seconds = time.perf_counter() - fit_start
+                
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                
+                nbytes = (
+                    X_train_scaled.data.nbytes + X_train_scaled.indices.nbytes + X_train_scaled.indptr.nbytes
+                    if sparse.issparse(X_train_scaled) else X_train_scaled.nbytes
+                )
+                comparison[label] = {
+                    'prepare_seconds': prepare_seconds,
+                    'fit_seconds': fit_seconds,
+                    'prepare_peak_mb': prepare_peak / 1024 ** 2,
+                    'peak_mb': peak / 1024 ** 2,
+                    'train_matrix_mb': nbytes / 1024 ** 2,
+                    'dtype': str(X_train_scaled.dtype)
+                }
+                print(
+                    f"{label} - prepare: {prepare_seconds:.2f}s, fit: {fit_seconds:.2f}s, "
+                    f"peak: {peak / 1024 ** 2:.1f} MB, matrix: {nbytes / 1024 ** 2:.1f} MB"
+                )
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self.configure_feature_path(original_sparse)
+        
+        return comparison
+    
+    def compare_imbalance_strategies(self, df: pd.DataFrame, model_name: str = 'logistic_regression',
+                                     strategies: Tuple[str, ...] = IMBALANCE_STRATEGIES) -> Dict[str, Dict[str, float]]:
+        """Compare resampling time, peak memory and holdout macro-F1 of each imbalance strategy"""
+        print(f"Comparing imbalance strategies with {model_name}...")
+        
+        X, y = self.preprocess_data(df.copy())
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=self.test_size, random_state=self.random_state, stratify=y
+        )
+        
+        original_imbalance = self.imbalance
+        comparison = {}
+        
+        try:
+            for strategy in strategies:
+                self.imbalance = strategy
+                sampler = self.imbalance_sampler()
+                
+                # tracemalloc sees numpy/scipy buffers, not native model internals
+                tracemalloc.start()
+                start = time.perf_counter()
+                if sampler is not None:
+                    X_balanced, y_balanced = sampler.fit_resample(X_train, y_train)
+                else:
+                    X_balanced, y_balanced = X_train, y_train
+                sample_weight = balanced_sample_weight(strategy, y_balanced)
+                resample_seconds = time.perf_counter() - start
+                _, resample_peak = tracemalloc.get_traced_memory()
+                
+                scaler = clone(self.scaler)
+                X_balanced = scaler.fit_transform(X_balanced)
+                model = clone(self.models[model_name])
+                fit_start = time.perf_counter()
+                model.fit(X_balanced, y_balanced, sample_weight=sample_weight)
+                fit_seconds = time.perf_counter() - fit_start
+                
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                
+                macro_f1 = f1_score(y_test, model.predict(scaler.transform(X_test)), average='macro')
+                comparison[strategy] = {
+                    'resample_seconds': resample_seconds,
+                    'fit_seconds': fit_seconds,
+                    'resample_peak_mb': resample_peak / 1024 ** 2,
+                    'peak_mb': peak / 1024 ** 2,
+                    'train_rows': X_balanced.shape[0],
+                    'macro_f1': macro_f1
+                }
+                print(
+                    f"{strategy} - resample: {resample_seconds:.2f}s, fit: {fit_seconds:.2f}s, "
+                    f"peak: {peak / 1024 ** 2:.1f} MB, rows: {X_balanced.shape[0]}, macro-F1: {macro_f1:.4f}"
+                )
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self.imbalance = original_imbalance
+        
+        return comparison
+    
+    def save_model(self, model_name: str = "expense_categorization_model", extra_metadata: Optional[Dict] = None):
         """Save the trained model and preprocessing components"""
         print("Saving model...")
         
@@ -309,23 +904,23 @@ class ExpenseCategorizationTrainer:
         # Save preprocessing components
         preprocessor_file = self.model_path / f"{model_name}_preprocessor.pkl"
         with open(preprocessor_file, 'wb') as f:
-            pickle.dump({
-                'text_vectorizer': self.text_vectorizer,
-                'label_encoder': self.label_encoder,
-                'scaler': self.scaler,
-                'feature_names': self.feature_names
-            }, f)
+            pickle.dump(self.preprocessor_state(), f)
         
         # Save model metadata
         metadata = {
             'model_name': model_name,
             'model_type': self.best_model.__class__.__name__,
             'accuracy': self.best_score,
-            'feature_count': len(self.feature_names),
+            'feature_count': self.text_feature_count + len(self.numeric_columns),
+            'text_vectorizer': self.text_vectorizer.__class__.__name__,
+            'sparse_features': self.sparse_features,
+            'feature_store_version': self.feature_store.version if self.feature_store is not None else None,
             'category_count': len(self.label_encoder.classes_),
             'categories': self.label_encoder.classes_.tolist(),
+            'model_classes': [int(c) for c in self.best_model.classes_],
             'training_date': datetime.now().isoformat(),
-            'version': '1.0.0'
+            'version': '1.0.0',
+            **(extra_metadata or {})
         }
         
         metadata_file = self.model_path / f"{model_name}_metadata.json"
@@ -336,8 +931,325 @@ class ExpenseCategorizationTrainer:
         print(f"Preprocessor saved to {preprocessor_file}")
         print(f"Metadata saved to {metadata_file}")
     
+    def load_new_data(self, since: datetime, chunksize: int = 100_000) -> pd.DataFrame:
+        """Load only expenses added after a point in time, chunk by chunk"""
+        print(f"Loading expenses added since {since.isoformat()}...")
+        
+        new_chunks = []
+        for chunk in self.iter_data_chunks(chunksize, added_after=since):
+            added_column = 'created_at' if 'created_at' in chunk.columns else 'date'
+            added_at = pd.to_datetime(chunk[added_column])
+            new_chunks.append(chunk[added_at > since])
+        
+        df = pd.concat(new_chunks, ignore_index=True) if new_chunks else pd.DataFrame()
+        print(f"Loaded {len(df)} new expense records")
+        return df
+    
+    def requires_all_classes(self, model) -> bool:
+        """Whether continuing this model needs every known category in the new rows"""
+        # Boosters continue through the native API with a fixed class count and
+        # partial_fit takes classes explicitly; the rest re-derive classes_ from y
+        return (
+            model.__class__.__name__ not in ('LGBMClassifier', 'XGBClassifier')
+            and not hasattr(model, 'partial_fit')
+        )
+    
+    def continue_training(self, model, X: FeatureMatrix, y: np.ndarray,
+                          extra_rounds: int = 50, extra_trees: int = 20):
+        """Return a copy of a fitted model trained further on new rows"""
+        model_type = model.__class__.__name__
+        
+        if model_type in ('LGBMClassifier', 'XGBClassifier'):
+            # The sklearn wrappers re-infer classes from y, which fails when a
+            # batch misses a category; the native APIs keep the model's classes
+            y_model = np.searchsorted(np.asarray(model.classes_), y)
+            updated = copy.deepcopy(model)
+            if model_type == 'LGBMClassifier':
+                updated._Booster = lgb.train(
+                    dict(model.booster_.params), lgb.Dataset(X, label=y_model),
+                    num_boost_round=extra_rounds, init_model=model.booster_, keep_training_booster=True
+                )
+            else:
+                params = model.get_xgb_params()
+                if len(model.classes_) > 2:
+                    params['num_class'] = len(model.classes_)
+                updated._Booster = xgb.train(
+                    params, xgb.DMatrix(X, label=y_model),
+                    num_boost_round=extra_rounds, xgb_model=model.get_booster()
+                )
+            updated.set_params(n_estimators=model.n_estimators + extra_rounds)
+        elif model_type in ('RandomForestClassifier', 'GradientBoostingClassifier'):
+            # Forests add trees fit on the new rows; GBM adds boosting stages
+            updated = copy.deepcopy(model)
+            updated.set_params(warm_start=True, n_estimators=model.n_estimators + extra_trees)
+            updated.fit(X, y)
+        elif hasattr(model, 'partial_fit'):
+            updated = copy.deepcopy(model)
+            updated.partial_fit(X, y, classes=model.classes_)
+        elif 'warm_start' in model.get_params():
+            updated = copy.deepcopy(model)
+            updated.set_params(warm_start=True)
+            updated.fit(X, y)
+        else:
+            raise ValueError(f"{model_type} does not support incremental training")
+        
+        return updated
+    
+    def incremental_train(self, model_name: str = "expense_categorization_model", holdout_fraction: float = 0.2,
+                          extra_rounds: int = 50, extra_trees: int = 20, tolerance: float = 0.0) -> Dict:
+        """Warm-start the saved model on new expenses and promote it if it does not regress"""
+        print("Starting incremental retraining...")
+        
+        with open(self.model_path / f"{model_name}_metadata.json", 'r') as f:
+            metadata = json.load(f)
+        model, preprocessor = load_format('pickle', self.model_path, model_name)
+        
+        # Reuse the fitted preprocessors so the vocabulary and scaling stay stable
+        self.text_vectorizer = preprocessor['text_vectorizer']
+        self.label_encoder = preprocessor['label_encoder']
+        self.scaler = preprocessor['scaler']
+        self.feature_names = preprocessor['feature_names']
+        self.numeric_columns = preprocessor['numeric_columns']
+        self.amount_bin_edges = preprocessor['amount_bin_edges']
+        self.sparse_features = preprocessor.get('sparse_features', True)
+        self.feature_dtype = np.float32 if self.sparse_features else np.float64
+        self.text_feature_count = metadata['feature_count'] - len(self.numeric_columns)
+        
+        # Resume after the newest row actually trained on, so rows held out
+        # for validation in the previous cycle are trained on in this one
+        since = datetime.fromisoformat(metadata.get('data_high_water_mark') or metadata['training_date'])
+        df = self.load_new_data(since).dropna(subset=['description', 'category'])
+        
+        # Warm starts cannot add classes; unseen categories wait for a full retrain
+        known = df['category'].isin(self.label_encoder.classes_)
+        if (~known).any():
+            print(f"Skipping {int((~known).sum())} rows with categories unknown to the model")
+            df = df[known]
+        if df.empty:
+            print("No new data to train on")
+            return {'promoted': False, 'new_rows': 0}
+        
+        # The latest fraction of the new rows forms the validation holdout
+        added_at = pd.to_datetime(df['created_at'] if 'created_at' in df.columns else df['date']).values
+        n_holdout = int(len(df) * holdout_fraction)
+        if n_holdout == 0 or n_holdout == len(df):
+            print(f"Too few new rows ({len(df)}) to train and validate; waiting for more data")
+            return {'promoted': False, 'new_rows': len(df), 'trained_rows': 0}
+        cutoff = np.sort(added_at)[len(df) - n_holdout - 1]
+        is_holdout = added_at > cutoff
+        
+        text_features, numeric_features, _ = build_feature_frame(df, self.amount_bin_edges)
+        numeric_features = numeric_features.reindex(columns=self.numeric_columns, fill_value=0).fillna(0)
+        X_unscaled = combine_features(
+            self.text_vectorizer.transform(text_features), numeric_features,
+            self.feature_dtype, self.sparse_features
+        )
+        X = self.scaler.transform(X_unscaled)
+        y = self.label_encoder.transform(df['category'])
+        
+        X_train, y_train = X[~is_holdout], y[~is_holdout]
+        X_holdout, y_holdout = X[is_holdout], y[is_holdout]
+        
+        missing = set(np.asarray(model.classes_, dtype=int)) - set(np.unique(y_train))
+        if missing and self.requires_all_classes(model):
+            print(
+                f"{model.__class__.__name__} needs every category in the new rows "
+                f"({len(missing)} missing); full retrain required"
+            )
+            return {'promoted': False, 'new_rows': len(df), 'trained_rows': 0}
+        
+        print(f"Continuing {model.__class__.__name__} on {len(y_train)} rows, validating on {len(y_holdout)}")
+        updated = self.continue_training(model, X_train, y_train, extra_rounds, extra_trees)
+        
+        current_accuracy = accuracy_score(y_holdout, model.predict(X_holdout)) if len(y_holdout) else 0.0
+        updated_accuracy = accuracy_score(y_holdout, updated.predict(X_holdout)) if len(y_holdout) else 0.0
+        promoted = len(y_holdout) > 0 and updated_accuracy >= current_accuracy - tolerance
+        
+        print(f"Recent holdout accuracy - current: {current_accuracy:.4f}, updated: {updated_accuracy:.4f}")
+        
+        if promoted:
+            self.best_model = updated
+            self.best_score = updated_accuracy
+            
+            # The student stays valid as its own artifact, but was distilled from an earlier teacher
+            student_metadata = {k: metadata[k] for k in ('student', 'distillation') if k in metadata}
+            if student_metadata:
+                student_metadata['student_teacher_training_date'] = metadata.get(
+                    'student_teacher_training_date', metadata['training_date']
+                )
+            self.save_model(model_name, extra_metadata={
+                'parent_training_date': metadata['training_date'],
+                'data_high_water_mark': pd.Timestamp(cutoff).isoformat(),
+                'incremental_updates': metadata.get('incremental_updates', 0) + 1,
+                'incremental_rows': int(len(y_train)),
+                **student_metadata
+            })
+            
+            # Exports of the parent would otherwise be served under the new version
+            for fmt in EXPORT_FORMATS:
+                for path in export_paths(self.model_path, model_name, fmt):
+                    if path.suffix != '.pkl' and path.exists():
+                        path.unlink()
+            if metadata.get('exports'):
+                self.export_model(X_unscaled[:1000], list(metadata['exports']), model_name)
+            print("Updated model promoted")
+        else:
+            print("Updated model regressed on recent holdout; keeping current model")
+        
+        return {
+            'promoted': promoted,
+            'new_rows': len(df),
+            'trained_rows': int(len(y_train)),
+            'current_accuracy': current_accuracy,
+            'updated_accuracy': updated_accuracy
+        }
+    
+    def soft_targets(self, X: FeatureMatrix, probabilities: np.ndarray,
+                     min_probability: float = 0.01) -> Tuple[FeatureMatrix, np.ndarray, np.ndarray]:
+        """Expand rows into (row, class) pairs weighted by teacher probability"""
+        rows, classes = np.nonzero(probabilities >= min_probability)
+        weights = probabilities[rows, classes]
+        return X[rows], classes, weights
+    
+    def model_profile(self, model, X_test: FeatureMatrix, y_test: np.ndarray) -> Dict[str, float]:
+        """Accuracy, serialized size and latency of a fitted model"""
+        X_row = X_test[:1]
+        X_batch = X_test[:1000]
+        return {
+            'model_type': model.__class__.__name__,
+            'accuracy': accuracy_score(y_test, model.predict(X_test)),
+            'size_bytes': len(pickle.dumps(model)),
+            'single_row_latency_ms': median_latency_ms(lambda: model.predict(X_row), 50),
+            'per_row_batch_latency_ms': median_latency_ms(lambda: model.predict(X_batch), 5) / X_batch.shape[0]
+        }
+    
+    def distill_student(self, student: str = 'logistic_regression', temperature: float = 1.0,
+                        model_name: str = "expense_categorization_model") -> Dict[str, Dict]:
+        """Train a compact student on the teacher's soft probabilities and save it alongside"""
+        print(f"Distilling {self.best_model.__class__.__name__} into a {student} student...")
+        
+        teacher = self.best_model
+        datasets = self.datasets
+        n_classes = len(self.label_encoder.classes_)
+        
+        # Prefer cached out-of-fold probabilities: they reflect how the teacher generalizes
+        oof = self.oof_predictions.get(self.best_model_name, {})
+        if 'y_proba' in oof and not np.isnan(oof['y_proba']).any():
+            X_student = self.scaler.transform(datasets['X_train'])
+            probabilities = oof['y_proba']
+        else:
+            print(f"No out-of-fold probabilities for {self.best_model_name}; using in-sample teacher probabilities")
+            X_student = datasets['X_train_scaled']
+            probabilities = np.zeros((X_student.shape[0], n_classes))
+            probabilities[:, np.asarray(teacher.classes_, dtype=int)] = teacher.predict_proba(X_student)
+        
+        if temperature != 1.0:
+            probabilities = probabilities ** (1.0 / temperature)
+            probabilities /= probabilities.sum(axis=1, keepdims=True)
+        
+        X_soft, y_soft, weights = self.soft_targets(X_student, probabilities)
+        model = clone(self.student_models[student])
+        model.fit(X_soft, y_soft, sample_weight=weights)
+        self.student_model = model
+        
+        X_test, y_test = datasets['X_test_scaled'], datasets['y_test']
+        comparison = {
+            'teacher': self.model_profile(teacher, X_test, y_test),
+            'student': self.model_profile(model, X_test, y_test)
+        }
+        comparison['student']['teacher_agreement'] = float(
+            np.mean(model.predict(X_test) == teacher.predict(X_test))
+        )
+        for role in ('teacher', 'student'):
+            profile = comparison[role]
+            print(
+                f"{role} ({profile['model_type']}) - Accuracy: {profile['accuracy']:.4f}, "
+                f"size: {profile['size_bytes'] / 1024 ** 2:.2f} MB, "
+                f"single row: {profile['single_row_latency_ms']:.3f} ms"
+            )
+        
+        # Save the student as a complete artifact set usable by ExpenseCategoryPredictor
+        student_name = f"{model_name}_student"
+        teacher_model, teacher_score = self.best_model, self.best_score
+        try:
+            self.best_model, self.best_score = model, comparison['student']['accuracy']
+            self.save_model(student_name, extra_metadata={'teacher': model_name, 'distillation': comparison})
+        finally:
+            self.best_model, self.best_score = teacher_model, teacher_score
+        
+        # Record the comparison on the teacher too, so callers can pick per path
+        metadata_file = self.model_path / f"{model_name}_metadata.json"
+        if metadata_file.exists():
+            with open(metadata_file, 'r') as f:
+                metadata = json.load(f)
+            metadata['student'] = student_name
+            metadata['distillation'] = comparison
+            with open(metadata_file, 'w') as f:
+                json.dump(metadata, f, indent=2)
+        
+        return comparison
+    
+    def preprocessor_state(self) -> Dict:
+        """Fitted preprocessing components needed to rebuild the feature pipeline"""
+        return {
+            'text_vectorizer': self.text_vectorizer,
+            'label_encoder': self.label_encoder,
+            'scaler': self.scaler,
+            'feature_names': self.feature_names,
+            'numeric_columns': self.numeric_columns,
+            'amount_bin_edges': self.amount_bin_edges,
+            'sparse_features': self.sparse_features
+        }
+    
+    def export_model(self, X_sample: FeatureMatrix, formats: Sequence[str] = EXPORT_FORMATS,
+                     model_name: str = "expense_categorization_model") -> Dict[str, Dict]:
+        """Export the saved model to inference formats and benchmark each one"""
+        print(f"Exporting model to {', '.join(formats)}...")
+        
+        X_sample = self.scaler.transform(X_sample)
+        classes = [int(c) for c in self.best_model.classes_]
+        exports = {}
+        
+        for fmt in formats:
+            try:
+                write_format(
+                    fmt, self.best_model, self.preprocessor_state(),
+                    self.model_path, model_name, X_sample.shape[1]
+                )
+                exports[fmt] = benchmark_format(fmt, self.model_path, model_name, X_sample, classes)
+            except ImportError as e:
+                # onnx/onnxmltools/onnxruntime are optional
+                print(f"Skipping {fmt} export: {e}")
+                continue
+            except Exception as e:
+                # The pickled model is already saved; one failed conversion must not fail training
+                print(f"Failed to export {fmt}: {type(e).__name__}: {e}")
+                continue
+            
+            print(
+                f"{fmt} - load: {exports[fmt]['load_seconds']:.3f}s, "
+                f"size: {exports[fmt]['size_bytes'] / 1024 ** 2:.1f} MB, "
+                f"single row: {exports[fmt]['single_row_latency_ms']:.2f} ms, "
+                f"batch of {exports[fmt]['batch_rows']}: {exports[fmt]['batch_latency_ms']:.2f} ms"
+            )
+        
+        # Record the measurements with the model metadata
+        metadata_file = self.model_path / f"{model_name}_metadata.json"
+        with open(metadata_file, 'r') as f:
+            metadata = json.load(f)
+        metadata['exports'] = exports
+        with open(metadata_file, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        
+        return exports
+    
     def load_from_database(self) -> pd.DataFrame:
-        """Load data from database (implement based on your database)"""
+        """Load raw expenses from the feature store, or sample data when none is configured"""
+        if self.feature_store is not None:
+            start_date, end_date = self.feature_date_range
+            table = self.feature_store.read(start_date, end_date, columns=STORE_RAW_COLUMNS, labelled_only=True)
+            return table.to_pandas()
+        
         # This is a placeholder - implement based on your database
         # For example, using SQLAlchemy:
         """
@@ -396,25 +1308,44 @@ class ExpenseCategorizationTrainer:
             ]
         })
     
-    def train(self):
+    def train(self, export_formats: Optional[Sequence[str]] = None, search: str = 'halving',
+              time_budget: float = 600, student: Optional[str] = None):
         """Main training pipeline"""
         print("Starting expense categorization model training...")
         
-        # Load data
-        df = self.load_data()
+        if self.feature_store is not None:
+            # Features were derived and vectorized by the ETL
+            X, y = self.load_store_features(*self.feature_date_range)
+        else:
+            # Load data
+            df = self.load_data()
+            
+            # Preprocess data, reusing cached features and splits when available
+            X, y = self.load_or_build_datasets(df)
         
-        # Preprocess data
-        X, y = self.preprocess_data(df)
+        # Split, resample and scale once; every later stage reuses the result
+        self.prepare_datasets(X, y)
         
         # Train models
         results = self.train_models(X, y)
         
         # Hyperparameter tuning
-        best_params = self.hyperparameter_tuning(X, y)
+        best_params = self.hyperparameter_tuning(X, y, search, time_budget)
+        self.log_best_model()
         
         # Save model
         self.save_model()
         
+        if export_formats:
+            self.export_model(X[:1000], export_formats)
+        
+        if student:
+            self.distill_student(student)
+        
+        # Wait for queued and spilled metrics and model uploads before returning
+        self.tracker.flush()
+        print(f"Experiment tracking: {self.tracker.summary()}")
+        
         print("Training completed!")
         print(f"Best model: {self.best_model.__class__.__name__}")
         print(f"Best accuracy: {self.best_score:.4f}")
@@ -426,18 +1357,89 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Train expense categorization model')
-    parser.add_argument('--data', required=True, help='Path to training data')
+    parser.add_argument('--data', help='Path to training data')
+    parser.add_argument('--feature-store', help='Train from ETL-written features under this directory')
+    parser.add_argument('--feature-version', help='Feature store version (default: latest)')
+    parser.add_argument('--start-date', help='First expense date to train on from the feature store (YYYY-MM-DD)')
+    parser.add_argument('--end-date', help='Last expense date to train on from the feature store (YYYY-MM-DD)')
     parser.add_argument('--model-path', default='models/', help='Path to save models')
     parser.add_argument('--experiment-name', default='expense-categorization', help='MLflow experiment name')
+    parser.add_argument('--tracking-uri', help='MLflow tracking URI (default: $MLFLOW_TRACKING_URI or localhost:5000)')
+    parser.add_argument('--log-models', choices=['best', 'all', 'none'], default='best',
+                        help='Which trained models to upload to MLflow')
+    parser.add_argument('--dense', action='store_true', help='Use the legacy dense float64 feature matrix')
+    parser.add_argument('--streaming', action='store_true', help='Train out-of-core with an incremental learner')
+    parser.add_argument('--streaming-learner', choices=['sgd', 'passive_aggressive'], default='sgd',
+                        help='Incremental learner for streaming training')
+    parser.add_argument('--chunksize', type=int, default=100_000, help='Rows per chunk for streaming training')
+    parser.add_argument('--epochs', type=int, default=1, help='Passes over the data for streaming training')
+    parser.add_argument('--search', choices=['halving', 'grid'], default='halving',
+                        help='Hyperparameter search strategy')
+    parser.add_argument('--search-budget', type=float, default=600,
+                        help='Wall-clock seconds per model for halving search')
+    parser.add_argument('--cores', type=int, help='Core budget for parallel model training (default: all)')
+    parser.add_argument('--cache-dir', help='Reuse preprocessed and resampled datasets cached here')
+    parser.add_argument('--export-formats', nargs='+', choices=EXPORT_FORMATS,
+                        help='Export and benchmark inference formats after training')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Warm-start the saved model on expenses added since its training date')
+    parser.add_argument('--holdout-fraction', type=float, default=0.2,
+                        help='Latest fraction of new rows used to validate incremental updates')
+    parser.add_argument('--distill', choices=['logistic_regression', 'lightgbm'],
+                        help='Also train and save a compact student model distilled from the best model')
+    parser.add_argument('--compare-feature-paths', action='store_true',
+                        help='Report peak memory and fit time for sparse vs dense features and exit')
+    parser.add_argument('--imbalance', choices=IMBALANCE_STRATEGIES, default='smote',
+                        help='Class imbalance handling: resampling strategy or cost-sensitive class weights')
+    parser.add_argument('--compare-imbalance', action='store_true',
+                        help='Report time, peak memory and macro-F1 for each imbalance strategy and exit')
     
     args = parser.parse_args()
+    if not args.data and not args.feature_store:
+        parser.error('one of --data or --feature-store is required')
+    if (args.start_date or args.end_date) and not args.feature_store:
+        parser.error('--start-date/--end-date only apply with --feature-store')
     
-    # Set MLflow experiment
-    mlflow.set_experiment(args.experiment_name)
+    feature_store = None
+    if args.feature_store:
+        feature_store = (
+            FeatureStore(args.feature_store, args.feature_version) if args.feature_version
+            else FeatureStore.latest(args.feature_store)
+        )
+    
+    # MLflow experiment; connects on first use and falls back to a local store
+    tracker = ExperimentTracker(args.experiment_name, args.tracking_uri, log_models=args.log_models)
     
     # Train model
-    trainer = ExpenseCategorizationTrainer(args.data, args.model_path)
-    results, best_params = trainer.train()
+    trainer = ExpenseCategorizationTrainer(
+        args.data, args.model_path, sparse_features=not args.dense, cache_dir=args.cache_dir,
+        core_budget=args.cores, tracker=tracker, imbalance=args.imbalance, feature_store=feature_store,
+        start_date=datetime.strptime(args.start_date, '%Y-%m-%d') if args.start_date else None,
+        end_date=datetime.strptime(args.end_date, '%Y-%m-%d') if args.end_date else None
+    )
+    
+    if args.compare_feature_paths:
+        comparison = trainer.compare_feature_paths(trainer.load_data())
+        print(json.dumps(comparison, indent=2))
+        return
+    
+    if args.compare_imbalance:
+        comparison = trainer.compare_imbalance_strategies(trainer.load_data())
+        print(json.dumps(comparison, indent=2))
+        return
+    
+    if args.incremental:
+        result = trainer.incremental_train(holdout_fraction=args.holdout_fraction)
+        print(f"\nIncremental Results: {result}")
+        return
+    
+    if args.streaming:
+        results = trainer.train_streaming(args.streaming_learner, args.chunksize, args.epochs)
+        trainer.save_model()
+        print(f"\nStreaming Results: {results}")
+        return
+    
+    results, best_params = trainer.train(args.export_formats, args.search, args.search_budget, args.distill)
     
     print("\nTraining Results:")
     for model_name, metrics in results.items():
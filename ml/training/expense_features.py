@@ -0,0 +1,105 @@
+"""
+Expense Categorization Features
+Feature engineering shared by the ETL, model training and inference so that
+saved models are always scored with exactly the pipeline they were trained on.
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Optional, Tuple, Union
+
+from scipy import sparse
+
+FeatureMatrix = Union[sparse.csr_matrix, np.ndarray]
+
+# Bump when a derived feature's definition changes; feature store versions depend on it
+FEATURE_SCHEMA_VERSION = 1
+
+# Stateless per-row features persisted by the ETL feature store
+ROW_FEATURE_COLUMNS = [
+    'description_clean', 'amount_log', 'description_length', 'word_count',
+    'month', 'day_of_week', 'is_weekend', 'vendor_clean', 'vendor_length'
+]
+
+# Stored columns numeric_feature_frame reads
+NUMERIC_SOURCE_COLUMNS = [
+    'amount', 'amount_log', 'description_length', 'word_count',
+    'month', 'day_of_week', 'is_weekend', 'vendor_length'
+]
+
+
+def derive_row_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the stateless per-row features shared by the ETL, training and inference"""
+    df = df.copy()
+
+    # Text preprocessing
+    df['description_clean'] = df['description'].str.lower().str.strip()
+
+    # Feature engineering
+    df['amount_log'] = np.log1p(df['amount'])
+    df['description_length'] = df['description'].str.len()
+    df['word_count'] = df['description'].str.split().str.len()
+
+    # Date features
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+        df['month'] = df['date'].dt.month
+        df['day_of_week'] = df['date'].dt.dayofweek
+        df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+
+    # Vendor features
+    if 'vendor' in df.columns:
+        df['vendor_clean'] = df['vendor'].str.lower().str.strip()
+        df['vendor_length'] = df['vendor'].str.len()
+
+    return df
+
+
+def numeric_feature_frame(features: pd.DataFrame,
+                          amount_bin_edges: Optional[np.ndarray] = None
+                          ) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Select the model's numeric columns from derived row features, binning amounts
+
+    When ``amount_bin_edges`` is None the amount bins are fitted on this batch;
+    otherwise the given edges are reused so every batch is binned identically.
+    """
+    features = features.copy()
+    if amount_bin_edges is None:
+        features['amount_binned'], amount_bin_edges = pd.cut(
+            features['amount'], bins=10, labels=False, retbins=True
+        )
+    else:
+        features['amount_binned'] = pd.cut(
+            features['amount'].clip(amount_bin_edges[0], amount_bin_edges[-1]),
+            bins=amount_bin_edges, labels=False, include_lowest=True
+        )
+
+    numeric_features = features[['amount_log', 'amount_binned', 'description_length', 'word_count']].fillna(0)
+
+    if 'month' in features.columns:
+        numeric_features = pd.concat([numeric_features, features[['month', 'day_of_week', 'is_weekend']]], axis=1)
+
+    if 'vendor_length' in features.columns:
+        numeric_features = pd.concat([numeric_features, features[['vendor_length']].fillna(0)], axis=1)
+
+    return numeric_features, amount_bin_edges
+
+
+def build_feature_frame(df: pd.DataFrame,
+                        amount_bin_edges: Optional[np.ndarray] = None
+                        ) -> Tuple[pd.Series, pd.DataFrame, np.ndarray]:
+    """Derive cleaned description text and numeric features for a batch"""
+    features = derive_row_features(df)
+    numeric_features, amount_bin_edges = numeric_feature_frame(features, amount_bin_edges)
+    text_features = features['description_clean'].fillna('')
+    return text_features, numeric_features, amount_bin_edges
+
+
+def combine_features(X_text: sparse.csr_matrix, numeric_features: pd.DataFrame,
+                     dtype=np.float32, sparse_output: bool = True) -> FeatureMatrix:
+    """Stack vectorized text and numeric features into one matrix"""
+    X_numeric = numeric_features.values.astype(dtype)
+
+    if sparse_output:
+        return sparse.hstack([X_text, sparse.csr_matrix(X_numeric)], format='csr', dtype=dtype)
+    return np.hstack([X_text.toarray(), X_numeric])
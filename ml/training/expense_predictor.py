@@ -0,0 +1,247 @@
+"""
+Expense Categorization Predictor
+Loads the artifacts written by ExpenseCategorizationTrainer.save_model once and
+categorizes expenses in vectorized batches, with a micro-batching queue for
+single-item callers and an optional prediction cache for repeated expenses.
+"""
+
+import pandas as pd
+import numpy as np
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import logging
+
+from expense_features import build_feature_frame, combine_features
+from model_export import load_format
+from prediction_cache import PredictionCache
+
+logger = logging.getLogger(__name__)
+
+
+class ExpenseCategoryPredictor:
+    def __init__(self, model_path: str = "models/", model_name: str = "expense_categorization_model",
+                 model_format: str = 'pickle', max_batch_size: int = 256, max_wait_ms: float = 5.0,
+                 latency_window: int = 10_000, cache: Optional[PredictionCache] = None):
+        self.model_path = Path(model_path)
+        self.model_name = model_name
+        self.model_format = model_format
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self.load()
+
+        # Micro-batching state for single-item callers
+        self._requests = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        # Rolling latency samples in milliseconds
+        self._batch_latencies = deque(maxlen=latency_window)
+        self._request_latencies = deque(maxlen=latency_window)
+        self._rows_predicted = 0
+
+    def load(self):
+        """Load the model, preprocessing components and metadata"""
+        metadata_file = self.model_path / f"{self.model_name}_metadata.json"
+        with open(metadata_file, 'r') as f:
+            self.metadata = json.load(f)
+
+        # joblib bundles are memory-mapped; onnx scores through onnxruntime
+        self.model, preprocessor = load_format(
+            self.model_format, self.model_path, self.model_name, self.metadata.get('model_classes')
+        )
+
+        self.text_vectorizer = preprocessor['text_vectorizer']
+        self.label_encoder = preprocessor['label_encoder']
+        self.scaler = preprocessor['scaler']
+        self.numeric_columns = preprocessor['numeric_columns']
+        self.amount_bin_edges = preprocessor['amount_bin_edges']
+        self.sparse_features = preprocessor.get('sparse_features', True)
+        self.feature_dtype = np.float32 if self.sparse_features else np.float64
+        self.categories = self.label_encoder.classes_
+
+        # Cached predictions are only valid for the model that produced them
+        self.model_version = f"{self.metadata['version']}:{self.metadata['training_date']}"
+        if getattr(self, 'cache', None) is not None:
+            self.cache.set_model_version(self.model_version)
+
+        logger.info(
+            f"Loaded {self.metadata['model_type']} categorization model "
+            f"({len(self.categories)} categories, {self.model_format}) from {self.model_path}"
+        )
+
+    def transform(self, df: pd.DataFrame):
+        """Rebuild the training feature matrix for a batch of expenses"""
+        df = df.copy()
+        df['description'] = df['description'].fillna('')
+        df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0)
+
+        text_features, numeric_features, _ = build_feature_frame(df, self.amount_bin_edges)
+
+        # Align to the training columns, e.g. when a batch has no date or vendor
+        numeric_features = numeric_features.reindex(columns=self.numeric_columns, fill_value=0).fillna(0)
+
+        X_text = self.text_vectorizer.transform(text_features)
+        X = combine_features(X_text, numeric_features, self.feature_dtype, self.sparse_features)
+        return self.scaler.transform(X)
+
+    def _scores(self, X) -> np.ndarray:
+        """Class probabilities, or softmax-normalized margins for margin-only models"""
+        if hasattr(self.model, 'predict_proba'):
+            return self.model.predict_proba(X)
+
+        margins = np.asarray(self.model.decision_function(X), dtype=np.float64)
+        if margins.ndim == 1:
+            margins = np.column_stack([-margins, margins])
+        margins -= margins.max(axis=1, keepdims=True)
+        exp = np.exp(margins)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Return per-category probabilities for a DataFrame of expenses"""
+        start = time.perf_counter()
+        probabilities = self._scores(self.transform(df))
+        self._record_batch(len(df), start)
+
+        # Model classes are label-encoded category indices
+        columns = self.label_encoder.inverse_transform(np.asarray(self.model.classes_, dtype=int))
+        return pd.DataFrame(probabilities, index=df.index, columns=columns)
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """Return the predicted category for each expense"""
+        return self.predict_with_stats(df)[0]
+
+    def predict_with_stats(self, df: pd.DataFrame) -> Tuple[np.ndarray, Dict[str, float]]:
+        """Predict categories and report this call's own cache hits and scored rows"""
+        stats = {'lookups': len(df), 'cache_hits': 0, 'rows_scored': len(df), 'hit_rate': 0.0, 'scoring_avoided': 0.0}
+        if df.empty:
+            return np.array([], dtype=object), stats
+        if self.cache is None:
+            return self._score(df), stats
+
+        keys = self.cache.keys(df)
+        predictions = np.array(self.cache.get_many(list(keys)), dtype=object)
+        missing = np.array([p is None for p in predictions])
+        stats['cache_hits'] = int((~missing).sum())
+        stats['rows_scored'] = 0
+        if missing.any():
+            # Score each distinct uncached expense once
+            unique_keys, first_rows = np.unique(keys[missing], return_index=True)
+            miss_rows = np.flatnonzero(missing)[first_rows]
+            scored = dict(zip(unique_keys, self._score(df.iloc[miss_rows])))
+            self.cache.put_many(scored)
+            predictions[missing] = [scored[key] for key in keys[missing]]
+            stats['rows_scored'] = len(scored)
+
+        stats['hit_rate'] = stats['cache_hits'] / len(df)
+        # Cache hits plus within-batch duplicates that were never scored
+        stats['scoring_avoided'] = 1 - stats['rows_scored'] / len(df)
+        return predictions, stats
+
+    def _score(self, df: pd.DataFrame) -> np.ndarray:
+        """Vectorize and score a batch with the model"""
+        start = time.perf_counter()
+        predictions = self.model.predict(self.transform(df))
+        self._record_batch(len(df), start)
+
+        return self.label_encoder.inverse_transform(np.asarray(predictions, dtype=int))
+
+    def predict_top_k(self, df: pd.DataFrame, k: int = 3) -> pd.DataFrame:
+        """Return the k most likely categories and their probabilities per expense"""
+        probabilities = self.predict_proba(df)
+        k = min(k, probabilities.shape[1])
+
+        values = probabilities.values
+        top_idx = np.argsort(-values, axis=1)[:, :k]
+        top_prob = np.take_along_axis(values, top_idx, axis=1)
+        top_cat = probabilities.columns.values[top_idx]
+
+        result = {}
+        for rank in range(k):
+            result[f'category_{rank + 1}'] = top_cat[:, rank]
+            result[f'probability_{rank + 1}'] = top_prob[:, rank]
+        return pd.DataFrame(result, index=df.index)
+
+    def submit(self, expense: Dict) -> Future:
+        """Queue a single expense for micro-batched prediction"""
+        self._ensure_worker()
+        future = Future()
+        self._requests.put((expense, future, time.perf_counter()))
+        return future
+
+    def predict_one(self, expense: Dict, timeout: Optional[float] = None) -> str:
+        """Predict a single expense, batched together with concurrent callers"""
+        return self.submit(expense).result(timeout=timeout)
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopped.clear()
+                self._worker = threading.Thread(
+                    target=self._batch_loop, name='expense-predictor-batcher', daemon=True
+                )
+                self._worker.start()
+
+    def _batch_loop(self):
+        """Drain the request queue into batches bounded by size and wait time"""
+        while not self._stopped.is_set():
+            try:
+                batch = [self._requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            expenses, futures, enqueued = zip(*batch)
+            try:
+                predictions = self.predict(pd.DataFrame(list(expenses)))
+            except Exception as e:
+                logger.error(f"Micro-batch prediction failed: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            now = time.perf_counter()
+            for future, prediction, queued_at in zip(futures, predictions, enqueued):
+                self._request_latencies.append((now - queued_at) * 1000)
+                future.set_result(prediction)
+
+    def _record_batch(self, rows: int, start: float):
+        self._batch_latencies.append((time.perf_counter() - start) * 1000)
+        self._rows_predicted += rows
+
+    def latency_metrics(self) -> Dict[str, float]:
+        """p50/p99 latency in milliseconds for batches and queued single requests"""
+        metrics = {'rows_predicted': self._rows_predicted, 'batches': len(self._batch_latencies)}
+        for name, samples in (('batch', self._batch_latencies), ('request', self._request_latencies)):
+            if samples:
+                values = np.fromiter(samples, dtype=np.float64)
+                metrics[f'{name}_p50_ms'] = float(np.percentile(values, 50))
+                metrics[f'{name}_p99_ms'] = float(np.percentile(values, 99))
+        return metrics
+
+    def cache_metrics(self) -> Dict[str, float]:
+        """Prediction cache hit rate, or empty when caching is disabled"""
+        return self.cache.metrics() if self.cache is not None else {}
+
+    def close(self):
+        """Stop the micro-batching worker"""
+        self._stopped.set()
+        if self._worker is not None:
+            self._worker.join()
@@ -0,0 +1,223 @@
+"""
+Expense Feature Store
+Model-ready expense features shared by ExpenseETL and the categorization
+trainer. The ETL writes row-level features and hashed text vectors for each
+date range it processes; training reads them back with column pruning and
+date-range predicate pushdown instead of re-deriving features from raw data.
+
+Layout (hive-partitioned Parquet, one directory per feature version):
+
+    <root>/v=<version>/_manifest.json
+    <root>/v=<version>/_vectorizer.joblib
+    <root>/v=<version>/expense_date=YYYY-MM-DD/part.parquet
+
+Writes are idempotent per expense_date partition: the written date range is
+authoritative, so rows an earlier write stored for that range (or with the
+same expense id) are replaced, whatever range the earlier write covered.
+
+The version is derived from the feature schema and the text vectorizer
+settings, so changing either starts a new version instead of mixing
+incompatible vectors.
+"""
+
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import joblib
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from expense_features import FEATURE_SCHEMA_VERSION, ROW_FEATURE_COLUMNS, derive_row_features
+
+# Raw columns stored next to the features for labels, filtering and rebuilding
+RAW_COLUMNS = [
+    'id', 'organization_id', 'date', 'created_at', 'description', 'vendor',
+    'amount', 'category', 'is_auto_categorized'
+]
+
+PARTITIONING = ds.partitioning(pa.schema([('expense_date', pa.string())]), flavor='hive')
+
+
+def text_vectorizer(n_features: int = 2 ** 16) -> HashingVectorizer:
+    """Stateless term-count vectorizer, so every ETL worker writes compatible vectors"""
+    return HashingVectorizer(
+        n_features=n_features,
+        stop_words='english',
+        ngram_range=(1, 2),
+        alternate_sign=False,
+        norm=None,  # raw counts; TF-IDF weighting is fitted at training time
+        dtype=np.float32
+    )
+
+
+class FeatureStore:
+    def __init__(self, root: str, version: Optional[str] = None, n_features: int = 2 ** 16):
+        self.root = Path(root)
+        if version is None:
+            self.text_vectorizer = text_vectorizer(n_features)
+            self.version = self.version_for(self.text_vectorizer)
+        else:
+            self.version = version
+            self.text_vectorizer = joblib.load(self.version_dir / '_vectorizer.joblib')
+        self._manifest_lock = threading.Lock()
+
+    @classmethod
+    def latest(cls, root: str) -> 'FeatureStore':
+        """Open the most recently created version under root"""
+        manifests = sorted(
+            Path(root).glob('v=*/_manifest.json'),
+            key=lambda path: json.loads(path.read_text())['created_at']
+        )
+        if not manifests:
+            raise FileNotFoundError(f"No feature store versions under {root}")
+        return cls(root, manifests[-1].parent.name[len('v='):])
+
+    @staticmethod
+    def version_for(vectorizer: HashingVectorizer) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps(ROW_FEATURE_COLUMNS).encode())
+        digest.update(json.dumps(vectorizer.get_params(), sort_keys=True, default=str).encode())
+        return f"{FEATURE_SCHEMA_VERSION}-{digest.hexdigest()[:8]}"
+
+    @property
+    def version_dir(self) -> Path:
+        return self.root / f"v={self.version}"
+
+    @property
+    def n_text_features(self) -> int:
+        return self.text_vectorizer.n_features
+
+    def _ensure_manifest(self):
+        with self._manifest_lock:
+            manifest_file = self.version_dir / '_manifest.json'
+            if manifest_file.exists():
+                return
+            self.version_dir.mkdir(parents=True, exist_ok=True)
+            joblib.dump(self.text_vectorizer, self.version_dir / '_vectorizer.joblib')
+            manifest = {
+                'version': self.version,
+                'schema_version': FEATURE_SCHEMA_VERSION,
+                'row_feature_columns': ROW_FEATURE_COLUMNS,
+                'text_vectorizer': self.text_vectorizer.get_params(),
+                'n_text_features': self.n_text_features,
+                'created_at': datetime.now().isoformat()
+            }
+            tmp_file = manifest_file.with_suffix('.tmp')
+            tmp_file.write_text(json.dumps(manifest, indent=2, default=str))
+            tmp_file.replace(manifest_file)
+
+    def write(self, df: pd.DataFrame, start_date: datetime, end_date: datetime) -> int:
+        """Persist features for one processed date range, replacing stored rows in that range"""
+        self._ensure_manifest()
+
+        features = derive_row_features(df)
+        if len(features):
+            X_text = self.text_vectorizer.transform(features['description_clean'].fillna('')).tocsr()
+        else:
+            # An empty range still clears its partitions; the vectorizer rejects empty input
+            X_text = sparse.csr_matrix((0, self.n_text_features), dtype=np.float32)
+        columns = [c for c in RAW_COLUMNS + ROW_FEATURE_COLUMNS if c in features.columns]
+
+        table = pa.Table.from_pandas(features[columns], preserve_index=False)
+        offsets = pa.array(X_text.indptr.astype(np.int32))
+        table = table.append_column(
+            'text_indices', pa.ListArray.from_arrays(offsets, pa.array(X_text.indices.astype(np.int32)))
+        )
+        table = table.append_column('text_values', pa.ListArray.from_arrays(offsets, pa.array(X_text.data)))
+
+        # Every day in the range is rewritten, including days that now have no rows
+        expense_dates = features['date'].dt.strftime('%Y-%m-%d').values
+        days = set(pd.date_range(start_date.date(), end_date.date(), freq='D').strftime('%Y-%m-%d'))
+        for expense_date in sorted(days | set(expense_dates)):
+            rows = np.flatnonzero(expense_dates == expense_date)
+            self._replace_partition(expense_date, table.take(pa.array(rows)), start_date, end_date)
+
+        return len(features)
+
+    def _replace_partition(self, expense_date: str, new_rows: pa.Table, start_date: datetime, end_date: datetime):
+        """Rewrite one expense_date partition as a single file holding the merged rows"""
+        partition_dir = self.version_dir / f"expense_date={expense_date}"
+        existing_files = sorted(partition_dir.glob('*.parquet'))
+
+        parts = []
+        for existing_file in existing_files:
+            existing = pq.read_table(existing_file)
+            dates = pd.to_datetime(existing.column('date').to_pandas())
+            keep = ~((dates >= start_date) & (dates <= end_date)).values
+            if 'id' in existing.column_names and 'id' in new_rows.column_names:
+                keep &= ~existing.column('id').to_pandas().isin(new_rows.column('id').to_pandas()).values
+            if keep.any():
+                parts.append(existing.filter(pa.array(keep)))
+        if new_rows.num_rows:
+            parts = [part.select(new_rows.column_names).cast(new_rows.schema) for part in parts] + [new_rows]
+
+        if parts:
+            partition_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file = partition_dir / '.part.parquet.tmp'
+            pq.write_table(pa.concat_tables(parts), tmp_file)
+            tmp_file.replace(partition_dir / 'part.parquet')
+        for existing_file in existing_files:
+            if existing_file.name != 'part.parquet' or not parts:
+                existing_file.unlink()
+
+    def _scan_args(self, start_date: Optional[datetime], end_date: Optional[datetime],
+                   columns: Optional[List[str]], labelled_only: bool, added_after: Optional[datetime]):
+        """Dataset, pruned columns and pushed-down filter for a read"""
+        dataset = ds.dataset(self.version_dir, format='parquet', partitioning=PARTITIONING)
+
+        expression = None
+        conditions = []
+        if start_date is not None:
+            conditions.append(ds.field('expense_date') >= f"{start_date:%Y-%m-%d}")
+        if end_date is not None:
+            conditions.append(ds.field('expense_date') <= f"{end_date:%Y-%m-%d}")
+        if labelled_only:
+            # Train on human-entered categories, never on the model's own predictions
+            conditions.append(ds.field('is_auto_categorized') == 0)
+            conditions.append(ds.field('category') != 'Uncategorized')
+        if added_after is not None:
+            added_column = 'created_at' if 'created_at' in dataset.schema.names else 'date'
+            conditions.append(ds.field(added_column) > pa.scalar(added_after, dataset.schema.field(added_column).type))
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        if columns is not None:
+            columns = [c for c in columns if c in dataset.schema.names]
+        return dataset, columns, expression
+
+    def read(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+             columns: Optional[List[str]] = None, labelled_only: bool = False,
+             added_after: Optional[datetime] = None) -> pa.Table:
+        """Read a date range, loading only the requested columns and matching partitions"""
+        dataset, columns, expression = self._scan_args(start_date, end_date, columns, labelled_only, added_after)
+        return dataset.to_table(columns=columns, filter=expression)
+
+    def iter_batches(self, batch_size: int, start_date: Optional[datetime] = None,
+                     end_date: Optional[datetime] = None, columns: Optional[List[str]] = None,
+                     labelled_only: bool = False, added_after: Optional[datetime] = None) -> Iterator[pd.DataFrame]:
+        """Stream a read as DataFrames of at most batch_size rows"""
+        dataset, columns, expression = self._scan_args(start_date, end_date, columns, labelled_only, added_after)
+        for batch in dataset.to_batches(batch_size=batch_size, columns=columns, filter=expression):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    def text_matrix(self, table: pa.Table) -> sparse.csr_matrix:
+        """Rebuild the CSR term-count matrix from the stored text vector columns"""
+        if table.num_rows == 0:
+            raise ValueError("No feature store rows to build a text matrix from; check the date range and version")
+        indices = table.column('text_indices').combine_chunks()
+        values = table.column('text_values').combine_chunks()
+        offsets = indices.offsets.to_numpy()
+        return sparse.csr_matrix(
+            (values.flatten().to_numpy(), indices.flatten().to_numpy(), offsets - offsets[0]),
+            shape=(table.num_rows, self.n_text_features)
+        )
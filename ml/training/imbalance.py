@@ -0,0 +1,120 @@
+"""
+Expense Categorization Class Imbalance Strategies
+Pluggable alternatives to running exact-kNN SMOTE on the full feature matrix.
+
+Strategies:
+- smote: the original SMOTE up to the majority class count
+- class_weight: no resampling; balanced per-row sample weights instead
+- projected_smote: SMOTE whose neighbours are found on a TruncatedSVD
+  projection (approximate, via pynndescent when installed), interpolating
+  synthetic rows in the original sparse feature space
+- capped_smote: SMOTE with each class grown by at most a fixed ratio
+"""
+
+import numpy as np
+from typing import Dict, Optional
+
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.neighbors import NearestNeighbors
+from sklearn.utils import check_random_state
+from sklearn.utils.class_weight import compute_sample_weight
+from imblearn.base import BaseSampler
+from imblearn.over_sampling.base import BaseOverSampler
+from imblearn.over_sampling import SMOTE
+
+IMBALANCE_STRATEGIES = ('smote', 'class_weight', 'projected_smote', 'capped_smote')
+
+
+class CappedRatio:
+    """sampling_strategy that grows each class by at most max_ratio, never past the majority"""
+
+    def __init__(self, max_ratio: float = 3.0):
+        self.max_ratio = max_ratio
+
+    def __call__(self, y: np.ndarray) -> Dict[int, int]:
+        classes, counts = np.unique(y, return_counts=True)
+        majority = counts.max()
+        return {
+            int(c): int(min(majority, np.ceil(n * self.max_ratio)))
+            for c, n in zip(classes, counts) if n < majority
+        }
+
+    def __repr__(self) -> str:
+        # Stable repr so the dataset cache key does not change between runs
+        return f"CappedRatio(max_ratio={self.max_ratio})"
+
+
+class ProjectedSMOTE(BaseOverSampler):
+    """SMOTE with neighbour search on a low-dimensional projection"""
+
+    def __init__(self, sampling_strategy='auto', n_components: int = 100, k_neighbors: int = 5,
+                 random_state=None):
+        super().__init__()
+        self.sampling_strategy = sampling_strategy
+        self.n_components = n_components
+        self.k_neighbors = k_neighbors
+        self.random_state = random_state
+
+    def _neighbors(self, Z: np.ndarray) -> np.ndarray:
+        k = min(self.k_neighbors + 1, len(Z))
+        try:
+            from pynndescent import NNDescent
+            index = NNDescent(Z, n_neighbors=k, random_state=self.random_state)
+            neighbors, _ = index.neighbor_graph
+        except ImportError:
+            # Exact search is cheap once the projection is low-dimensional
+            neighbors = NearestNeighbors(n_neighbors=k).fit(Z).kneighbors(Z, return_distance=False)
+        return neighbors[:, 1:]
+
+    def _fit_resample(self, X, y):
+        random_state = check_random_state(self.random_state)
+        n_components = min(self.n_components, X.shape[1] - 1)
+        Z = TruncatedSVD(n_components=n_components, random_state=self.random_state).fit_transform(X)
+
+        X_parts, y_parts = [X], [y]
+        for class_label, n_samples in self.sampling_strategy_.items():
+            if n_samples == 0:
+                continue
+            class_rows = np.flatnonzero(y == class_label)
+            if len(class_rows) < 2:
+                continue
+
+            neighbors = self._neighbors(Z[class_rows])
+            base = random_state.randint(len(class_rows), size=n_samples)
+            partner = neighbors[base, random_state.randint(neighbors.shape[1], size=n_samples)]
+            gap = random_state.uniform(size=n_samples).astype(X.dtype)
+
+            # Interpolate in the original feature space, keeping sparsity
+            X_base, X_partner = X[class_rows[base]], X[class_rows[partner]]
+            if sparse.issparse(X):
+                X_new = sparse.diags(1 - gap) @ X_base + sparse.diags(gap) @ X_partner
+            else:
+                X_new = X_base + gap[:, None] * (X_partner - X_base)
+
+            X_parts.append(X_new)
+            y_parts.append(np.full(n_samples, class_label, dtype=y.dtype))
+
+        X_resampled = sparse.vstack(X_parts, format=X.format) if sparse.issparse(X) else np.vstack(X_parts)
+        return X_resampled, np.concatenate(y_parts)
+
+
+def make_sampler(strategy: str, random_state: int = 42, max_ratio: float = 3.0,
+                 n_components: int = 100) -> Optional[BaseSampler]:
+    """Build the resampler for a strategy, or None when it does not resample"""
+    if strategy == 'smote':
+        return SMOTE(random_state=random_state)
+    if strategy == 'class_weight':
+        return None
+    if strategy == 'projected_smote':
+        return ProjectedSMOTE(n_components=n_components, random_state=random_state)
+    if strategy == 'capped_smote':
+        return SMOTE(sampling_strategy=CappedRatio(max_ratio), random_state=random_state)
+    raise ValueError(f"Unsupported imbalance strategy: {strategy}")
+
+
+def balanced_sample_weight(strategy: str, y: np.ndarray) -> Optional[np.ndarray]:
+    """Per-row weights for cost-sensitive strategies, None otherwise"""
+    if strategy == 'class_weight':
+        return compute_sample_weight('balanced', y)
+    return None
@@ -0,0 +1,136 @@
+"""
+Expense Categorization Model Export
+Writes trained categorization models to inference-optimized formats and
+measures how quickly each format loads and scores.
+
+Supported formats:
+- pickle: the legacy save_model artifacts, measured as a baseline
+- joblib: model and preprocessors in one uncompressed bundle whose numpy
+  arrays can be memory-mapped and shared read-only across worker processes
+- onnx: the fitted model as an ONNX graph for CPU onnxruntime; feature
+  derivation still uses the saved preprocessors
+"""
+
+import numpy as np
+import pickle
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import joblib
+from scipy import sparse
+
+EXPORT_FORMATS = ('pickle', 'joblib', 'onnx')
+
+
+class OnnxCategorizationModel:
+    """Minimal predict/predict_proba adapter over an onnxruntime session"""
+
+    def __init__(self, path: Path, classes: List[int]):
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(str(path), providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.classes_ = np.asarray(classes)
+
+    def _run(self, X):
+        # onnxruntime tree and linear kernels take dense float32 input
+        if sparse.issparse(X):
+            X = X.toarray()
+        return self.session.run(None, {self.input_name: np.asarray(X, dtype=np.float32)})
+
+    def predict(self, X) -> np.ndarray:
+        return np.asarray(self._run(X)[0])
+
+    def predict_proba(self, X) -> np.ndarray:
+        return np.asarray(self._run(X)[1])
+
+
+def export_paths(model_path: Path, model_name: str, fmt: str) -> List[Path]:
+    """Files making up one exported format"""
+    if fmt == 'pickle':
+        return [model_path / f"{model_name}.pkl", model_path / f"{model_name}_preprocessor.pkl"]
+    if fmt == 'joblib':
+        return [model_path / f"{model_name}.joblib"]
+    if fmt == 'onnx':
+        return [model_path / f"{model_name}.onnx", model_path / f"{model_name}_preprocessor.pkl"]
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+
+def convert_to_onnx(model, n_features: int):
+    """Convert a fitted sklearn, XGBoost or LightGBM classifier to ONNX"""
+    model_type = model.__class__.__name__
+
+    # onnxmltools only accepts its own tensor types, skl2onnx only its own
+    if model_type in ('LGBMClassifier', 'XGBClassifier'):
+        import onnxmltools
+        from onnxmltools.convert.common.data_types import FloatTensorType
+
+        initial_types = [('features', FloatTensorType([None, n_features]))]
+        if model_type == 'LGBMClassifier':
+            return onnxmltools.convert_lightgbm(model, initial_types=initial_types, zipmap=False)
+        return onnxmltools.convert_xgboost(model, initial_types=initial_types)
+
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+
+    initial_types = [('features', FloatTensorType([None, n_features]))]
+    return convert_sklearn(model, initial_types=initial_types, options={type(model): {'zipmap': False}})
+
+
+def write_format(fmt: str, model, preprocessor: Dict, model_path: Path, model_name: str, n_features: int):
+    """Write one export format next to the save_model artifacts"""
+    if fmt == 'joblib':
+        # Uncompressed so joblib.load(mmap_mode='r') can map arrays in place
+        joblib.dump({'model': model, 'preprocessor': preprocessor},
+                    model_path / f"{model_name}.joblib", compress=0)
+    elif fmt == 'onnx':
+        onnx_model = convert_to_onnx(model, n_features)
+        with open(model_path / f"{model_name}.onnx", 'wb') as f:
+            f.write(onnx_model.SerializeToString())
+    elif fmt != 'pickle':
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+
+def load_format(fmt: str, model_path: Path, model_name: str, classes: List[int] = None):
+    """Load the model and preprocessor dict for one export format"""
+    if fmt == 'joblib':
+        bundle = joblib.load(model_path / f"{model_name}.joblib", mmap_mode='r')
+        return bundle['model'], bundle['preprocessor']
+
+    with open(model_path / f"{model_name}_preprocessor.pkl", 'rb') as f:
+        preprocessor = pickle.load(f)
+
+    if fmt == 'onnx':
+        return OnnxCategorizationModel(model_path / f"{model_name}.onnx", classes), preprocessor
+    if fmt == 'pickle':
+        with open(model_path / f"{model_name}.pkl", 'rb') as f:
+            return pickle.load(f), preprocessor
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+
+def median_latency_ms(fn, repeats: int) -> float:
+    """Median wall-clock milliseconds of repeated calls"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def benchmark_format(fmt: str, model_path: Path, model_name: str, X_sample, classes: List[int],
+                     single_repeats: int = 50, batch_repeats: int = 5) -> Dict[str, float]:
+    """Measure load time, on-disk size and inference latency for one format"""
+    start = time.perf_counter()
+    model, _ = load_format(fmt, model_path, model_name, classes)
+    load_seconds = time.perf_counter() - start
+
+    X_row = X_sample[:1]
+    return {
+        'load_seconds': load_seconds,
+        'size_bytes': sum(path.stat().st_size for path in export_paths(model_path, model_name, fmt)),
+        'single_row_latency_ms': median_latency_ms(lambda: model.predict(X_row), single_repeats),
+        'batch_rows': X_sample.shape[0],
+        'batch_latency_ms': median_latency_ms(lambda: model.predict(X_sample), batch_repeats)
+    }
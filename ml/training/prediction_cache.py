@@ -0,0 +1,212 @@
+"""
+Expense Categorization Prediction Cache
+Memoizes category predictions for repeated expenses ("Uber ride", "AWS
+monthly", the same vendor every month) so they are vectorized and scored once
+per model version.
+
+Entries are keyed on normalized description, normalized vendor and amount
+bucket, kept in a bounded in-process LRU and optionally shared across
+processes through a SQLite file. Date features are deliberately not part of
+the key, so a cached category is reused regardless of the expense date.
+
+Shared storage keeps rows per model version, so processes scoring with
+different versions during a rollout do not invalidate each other. Versions
+are evicted least-recently-used first, beyond max_versions or after
+version_ttl seconds without use.
+"""
+
+import pandas as pd
+import numpy as np
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Same buckets as the warehouse amount_bucket column
+AMOUNT_BUCKET_EDGES = [0, 10, 50, 100, 500, 1000, float('inf')]
+
+
+def normalize_text(values: pd.Series) -> pd.Series:
+    """Lowercase, drop digits and punctuation, collapse whitespace"""
+    return (
+        values.fillna('').astype(str).str.lower()
+        .str.replace(r'[\d\W_]+', ' ', regex=True)
+        .str.split().str.join(' ')
+    )
+
+
+class PredictionCache:
+    def __init__(self, max_entries: int = 100_000, storage_path: Optional[str] = None,
+                 max_versions: int = 3, version_ttl: float = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.storage_path = Path(storage_path) if storage_path else None
+        self.max_versions = max_versions
+        self.version_ttl = version_ttl
+        self.model_version = None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.scored = 0
+
+        if self.storage_path is not None:
+            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS predictions ("
+                    "model_version TEXT, cache_key TEXT, category TEXT, "
+                    "PRIMARY KEY (model_version, cache_key))"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS model_versions ("
+                    "model_version TEXT PRIMARY KEY, last_used REAL)"
+                )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections are not shareable across threads
+        if getattr(self._local, 'conn', None) is None:
+            self._local.conn = sqlite3.connect(self.storage_path, timeout=30)
+        return self._local.conn
+
+    def set_model_version(self, model_version: str):
+        """Invalidate in-memory entries when the scoring model changes"""
+        with self._lock:
+            if model_version != self.model_version:
+                self._entries.clear()
+                self.model_version = model_version
+
+        if self.storage_path is not None:
+            self._touch_version()
+            self._evict_versions()
+
+    def _touch_version(self):
+        """Record that the current model version was just used"""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO model_versions VALUES (?, ?)", (self.model_version, time.time())
+            )
+
+    def _evict_versions(self):
+        """Drop stored versions past max_versions or unused for longer than version_ttl"""
+        with self._connection() as conn:
+            versions = [row[0] for row in conn.execute(
+                "SELECT model_version FROM model_versions WHERE model_version != ? "
+                "ORDER BY last_used DESC", (self.model_version,)
+            )]
+            expired = {row[0] for row in conn.execute(
+                "SELECT model_version FROM model_versions WHERE last_used < ?",
+                (time.time() - self.version_ttl,)
+            )}
+            stale = [v for i, v in enumerate(versions) if i >= self.max_versions - 1 or v in expired]
+            # Rows written before versions were tracked have no model_versions entry
+            untracked = [row[0] for row in conn.execute(
+                "SELECT DISTINCT model_version FROM predictions "
+                "WHERE model_version NOT IN (SELECT model_version FROM model_versions)"
+            )]
+            for version in stale + untracked:
+                conn.execute("DELETE FROM predictions WHERE model_version = ?", (version,))
+                conn.execute("DELETE FROM model_versions WHERE model_version = ?", (version,))
+
+    def keys(self, df: pd.DataFrame) -> np.ndarray:
+        """Cache keys for a batch of expenses"""
+        description = normalize_text(df['description'])
+        vendor = normalize_text(df['vendor']) if 'vendor' in df.columns else pd.Series('', index=df.index)
+        bucket = pd.cut(
+            pd.to_numeric(df['amount'], errors='coerce').fillna(0).clip(lower=0),
+            bins=AMOUNT_BUCKET_EDGES, labels=False, include_lowest=True
+        ).astype(str)
+        return (description + '|' + vendor + '|' + bucket).values
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Look up keys in memory, then in shared storage"""
+        results = [None] * len(keys)
+        missing = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    results[i] = self._entries[key]
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+        if missing and self.storage_path is not None:
+            found = self._read_storage(list(missing))
+            self._touch_version()
+            self._remember(found)
+            disk_hits = 0
+            for key, category in found.items():
+                for i in missing.pop(key):
+                    results[i] = category
+                    disk_hits += 1
+            with self._lock:
+                self.disk_hits += disk_hits
+
+        with self._lock:
+            self.misses += sum(len(rows) for rows in missing.values())
+        return results
+
+    def put_many(self, predictions: Dict[str, str]):
+        """Store freshly scored predictions"""
+        with self._lock:
+            self.scored += len(predictions)
+        self._remember(predictions)
+        if self.storage_path is not None and predictions:
+            with self._connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)",
+                    [(self.model_version, key, category) for key, category in predictions.items()]
+                )
+            self._touch_version()
+
+    def _remember(self, predictions: Dict[str, str]):
+        with self._lock:
+            for key, category in predictions.items():
+                self._entries[key] = category
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _read_storage(self, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        conn = self._connection()
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(
+                f"SELECT cache_key, category FROM predictions "
+                f"WHERE model_version = ? AND cache_key IN ({placeholders})",
+                [self.model_version, *batch]
+            ).fetchall()
+            found.update(rows)
+        return found
+
+    def metrics(self) -> Dict[str, float]:
+        """Lifetime hit rate and how much scoring the cache avoided"""
+        with self._lock:
+            hits, disk_hits, misses = self.hits, self.disk_hits, self.misses
+            scored, evictions, entries = self.scored, self.evictions, len(self._entries)
+
+        lookups = hits + disk_hits + misses
+        return {
+            'lookups': lookups,
+            'memory_hits': hits,
+            'disk_hits': disk_hits,
+            'misses': misses,
+            'hit_rate': (hits + disk_hits) / lookups if lookups else 0.0,
+            'rows_scored': scored,
+            # Cache hits plus within-batch duplicates that were never scored
+            'scoring_avoided': 1 - scored / lookups if lookups else 0.0,
+            'entries': entries,
+            'evictions': evictions
+        }
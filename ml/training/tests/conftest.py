@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The training modules import each other as top-level siblings
+ML_TRAINING_DIR = Path(__file__).resolve().parents[1]
+if str(ML_TRAINING_DIR) not in sys.path:
+    sys.path.insert(0, str(ML_TRAINING_DIR))
+
+
+@pytest.fixture(scope='session')
+def trainer_module():
+    from benchmark_training import load_trainer_module
+    return load_trainer_module()
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from feature_store import FeatureStore
+
+
+def expenses(ids, dates, category='Travel'):
+    """Minimal raw expense rows as extracted by the ETL"""
+    return pd.DataFrame({
+        'id': ids,
+        'organization_id': 1,
+        'date': pd.to_datetime(dates),
+        'created_at': pd.to_datetime(dates),
+        'description': 'taxi to airport',
+        'vendor': 'Uber',
+        'amount': 25.0,
+        'category': category,
+        'is_auto_categorized': 0
+    })
+
+
+def test_overlapping_writes_replace_rows(tmp_path):
+    store = FeatureStore(str(tmp_path), n_features=2 ** 10)
+    month = pd.date_range('2024-01-01', '2024-01-31', freq='D')
+    store.write(expenses(range(len(month)), month), datetime(2024, 1, 1), datetime(2024, 1, 31))
+
+    # A daily backfill of Jan 15 rewrites that day, corrections and one removed row included
+    store.write(expenses([14], ['2024-01-15'], category='Meals'), datetime(2024, 1, 15), datetime(2024, 1, 15))
+    store.write(expenses([], []), datetime(2024, 1, 20), datetime(2024, 1, 20))
+    # Re-running an earlier range leaves the same rows behind
+    store.write(expenses(range(10), month[:10]), datetime(2024, 1, 1), datetime(2024, 1, 10))
+
+    df = store.read().to_pandas()
+    assert df['id'].is_unique
+    assert len(df) == len(month) - 1
+    assert 19 not in set(df['id'])
+    assert df.loc[df['id'] == 14, 'category'].item() == 'Meals'
+    assert len(list((tmp_path / f"v={store.version}").glob('expense_date=*/*.parquet'))) == len(month) - 1
+
+    X_text = store.text_matrix(store.read(datetime(2024, 1, 15), datetime(2024, 1, 15)))
+    assert X_text.shape == (1, store.n_text_features)
+
+
+def test_text_matrix_rejects_empty_table(tmp_path):
+    store = FeatureStore(str(tmp_path), n_features=2 ** 10)
+    store.write(expenses([1], ['2024-01-01']), datetime(2024, 1, 1), datetime(2024, 1, 1))
+
+    with pytest.raises(ValueError, match='No feature store rows'):
+        store.text_matrix(store.read(datetime(2025, 1, 1), datetime(2025, 1, 31)))
+
+
+def test_iter_batches_streams_rows_added_after(tmp_path):
+    store = FeatureStore(str(tmp_path), n_features=2 ** 10)
+    days = pd.date_range('2024-01-01', '2024-01-10', freq='D')
+    store.write(expenses(range(len(days)), days), datetime(2024, 1, 1), datetime(2024, 1, 10))
+
+    batches = list(store.iter_batches(3, columns=['id', 'category'], added_after=datetime(2024, 1, 4)))
+    assert all(len(batch) <= 3 for batch in batches)
+    assert sorted(pd.concat(batches)['id']) == list(range(4, 10))
+    assert list(batches[0].columns) == ['id', 'category']
@@ -0,0 +1,86 @@
+import json
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sklearn.base import clone
+
+from benchmark_training import generate_expenses
+from tracking import ExperimentTracker
+
+
+def daily_batch(n_rows, seed, day):
+    """New expenses added on one day, covering only some categories"""
+    batch = generate_expenses(n_rows, seed=seed, imbalance=2.0)
+    batch['created_at'] = day + pd.to_timedelta(range(n_rows), unit='s')
+    return batch
+
+
+def test_two_consecutive_daily_updates(tmp_path, trainer_module):
+    data_file = tmp_path / 'expenses.csv'
+    initial = generate_expenses(2000, seed=1)
+    initial['created_at'] = datetime.now() - timedelta(days=30)
+    initial.to_csv(data_file, index=False)
+
+    trainer = trainer_module.ExpenseCategorizationTrainer(
+        str(data_file), str(tmp_path / 'models'), tracker=ExperimentTracker(log_models='none')
+    )
+    X, y = trainer.preprocess_data(trainer.load_data())
+    model = clone(trainer.models['lightgbm']).set_params(n_estimators=20)
+    trainer.best_model = model.fit(trainer.scaler.fit_transform(X), y)
+    trainer.best_score = 0.0
+    trainer.save_model()
+
+    metadata_file = tmp_path / 'models' / 'expense_categorization_model_metadata.json'
+    first_day = datetime.now() + timedelta(days=1)
+    results, marks = [], []
+    for seed, day in ((2, first_day), (3, first_day + timedelta(days=1))):
+        day_rows = daily_batch(60, seed, day)
+        pd.concat([pd.read_csv(data_file), day_rows]).to_csv(data_file, index=False)
+
+        # Small daily batches miss rare categories; boosters must still continue
+        result = trainer.incremental_train(tolerance=1.0)
+        results.append(result)
+        assert result['trained_rows'] > 0
+        assert result['promoted']
+
+        metadata = json.loads(metadata_file.read_text())
+        marks.append(pd.Timestamp(metadata['data_high_water_mark']))
+        assert marks[-1] < pd.Timestamp(day_rows['created_at'].max())
+
+    # The first day's holdout rows are picked up again and trained on in the second update
+    assert results[1]['new_rows'] == 60 + (60 - results[0]['trained_rows'])
+    assert marks[1] > pd.Timestamp(first_day + timedelta(days=1))
+
+
+def test_promotion_reexports_and_keeps_student_metadata(tmp_path, trainer_module):
+    data_file = tmp_path / 'expenses.csv'
+    initial = generate_expenses(2000, seed=1)
+    initial['created_at'] = datetime.now() - timedelta(days=30)
+    initial.to_csv(data_file, index=False)
+
+    trainer = trainer_module.ExpenseCategorizationTrainer(
+        str(data_file), str(tmp_path / 'models'), tracker=ExperimentTracker(log_models='none')
+    )
+    X, y = trainer.preprocess_data(trainer.load_data())
+    model = clone(trainer.models['lightgbm']).set_params(n_estimators=20)
+    trainer.best_model = model.fit(trainer.scaler.fit_transform(X), y)
+    trainer.best_score = 0.0
+    trainer.save_model()
+    trainer.export_model(X[:100], ['pickle', 'joblib'])
+
+    metadata_file = tmp_path / 'models' / 'expense_categorization_model_metadata.json'
+    metadata = json.loads(metadata_file.read_text())
+    metadata.update({'student': 'expense_categorization_model_student', 'distillation': {'student': {}}})
+    metadata_file.write_text(json.dumps(metadata))
+
+    day_rows = daily_batch(60, 2, datetime.now() + timedelta(days=1))
+    pd.concat([pd.read_csv(data_file), day_rows]).to_csv(data_file, index=False)
+    assert trainer.incremental_train(extra_rounds=5, tolerance=1.0)['promoted']
+
+    metadata = json.loads(metadata_file.read_text())
+    assert set(metadata['exports']) == {'pickle', 'joblib'}
+    assert metadata['student'] == 'expense_categorization_model_student'
+    assert metadata['student_teacher_training_date'] < metadata['training_date']
+
+    exported, _ = trainer_module.load_format('joblib', tmp_path / 'models', 'expense_categorization_model')
+    assert exported.n_estimators == 25
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from sklearn.base import clone
+
+from benchmark_training import generate_expenses
+from model_export import OnnxCategorizationModel, write_format
+from tracking import ExperimentTracker
+
+pytest.importorskip('onnxruntime')
+pytest.importorskip('onnxmltools')
+pytest.importorskip('skl2onnx')
+
+
+@pytest.fixture(scope='module')
+def trained(tmp_path_factory, trainer_module):
+    model_path = tmp_path_factory.mktemp('models')
+    trainer = trainer_module.ExpenseCategorizationTrainer(
+        None, str(model_path), tracker=ExperimentTracker(log_models='none')
+    )
+    X, y = trainer.preprocess_data(generate_expenses(600, seed=7))
+    return trainer, model_path, trainer.scaler.fit_transform(X), y
+
+
+@pytest.mark.parametrize(
+    'model_name', ['random_forest', 'gradient_boosting', 'logistic_regression', 'xgboost', 'lightgbm']
+)
+def test_onnx_export_runs_in_onnxruntime(trained, model_name):
+    trainer, model_path, X, y = trained
+    model = clone(trainer.models[model_name])
+    if 'n_estimators' in model.get_params():
+        model.set_params(n_estimators=10)
+    model.fit(X, y)
+
+    write_format('onnx', model, trainer.preprocessor_state(), model_path, model_name, X.shape[1])
+    onnx_model = OnnxCategorizationModel(model_path / f"{model_name}.onnx", [int(c) for c in model.classes_])
+
+    X_sample = X[:100]
+    probabilities = onnx_model.predict_proba(X_sample)
+    assert probabilities.shape == (100, len(model.classes_))
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1.0, atol=1e-4)
+    assert np.mean(onnx_model.predict(X_sample) == model.predict(X_sample)) >= 0.95
@@ -0,0 +1,263 @@
+"""
+Expense Categorization Experiment Tracking
+Non-blocking MLflow tracking for the training pipeline. Nothing touches MLflow
+until the first run starts; from then on metrics, texts and models are pushed
+through a queue and logged by a background thread, so serializing and
+uploading artifacts never blocks training.
+
+If the configured tracking server is unreachable, runs are written to a
+local file store instead. When the queue is full, events are appended to
+spilled_events.jsonl in the fallback directory rather than blocking the
+training thread; spilled models are pickled next to it. flush() and close()
+replay spilled events into the runs they belong to.
+"""
+
+import itertools
+import json
+import os
+import pickle
+import queue
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACKING_URI = "http://localhost:5000"
+
+
+class ExperimentTracker:
+    def __init__(self, experiment_name: str = "expense-categorization", tracking_uri: Optional[str] = None,
+                 fallback_dir: str = "mlruns", log_models: str = 'best', connect_timeout: float = 2.0,
+                 max_queue: int = 1000):
+        if log_models not in ('best', 'all', 'none'):
+            raise ValueError(f"Unsupported log_models policy: {log_models}")
+
+        self.experiment_name = experiment_name
+        self.tracking_uri = tracking_uri or os.environ.get("MLFLOW_TRACKING_URI", DEFAULT_TRACKING_URI)
+        self.fallback_dir = Path(fallback_dir)
+        self.log_models = log_models
+        self.connect_timeout = connect_timeout
+
+        # Unbounded so run boundaries always keep their order; max_queue caps logging events
+        self._queue = queue.Queue()
+        self.max_queue = max_queue
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._configured = False
+        # Submit-side run tokens, mapped to MLflow run ids by the worker
+        self._run_tokens = itertools.count()
+        self._run_token = None
+        self._run_ids = {}
+        self.failed_events = 0
+        self.spilled_events = 0
+        self.replayed_events = 0
+
+    @property
+    def spill_file(self) -> Path:
+        return self.fallback_dir / 'spilled_events.jsonl'
+
+    def _resolve_tracking_uri(self) -> str:
+        """Use the configured server if it answers, else the local file store"""
+        if not self.tracking_uri.startswith(('http://', 'https://')):
+            return self.tracking_uri
+        try:
+            urllib.request.urlopen(f"{self.tracking_uri.rstrip('/')}/health", timeout=self.connect_timeout)
+            return self.tracking_uri
+        except Exception as e:
+            self.fallback_dir.mkdir(parents=True, exist_ok=True)
+            fallback = self.fallback_dir.resolve().as_uri()
+            logger.warning(f"MLflow server {self.tracking_uri} unreachable ({e}); logging to {fallback}")
+            return fallback
+
+    def _configure(self):
+        import mlflow
+
+        self.resolved_uri = self._resolve_tracking_uri()
+        mlflow.set_tracking_uri(self.resolved_uri)
+        mlflow.set_experiment(self.experiment_name)
+        self._configured = True
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._drain, name='mlflow-tracker', daemon=True)
+                self._worker.start()
+
+    def _drain(self):
+        """Apply queued events in order on a single thread (MLflow runs are thread-local)"""
+        while True:
+            event, args, kwargs = self._queue.get()
+            try:
+                if event == '_stop':
+                    return
+                if not self._configured:
+                    self._configure()
+                getattr(self, f'_do_{event}')(*args, **kwargs)
+            except Exception as e:
+                # Tracking failures must never fail training
+                self.failed_events += 1
+                logger.error(f"MLflow {event} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _submit(self, event: str, *args, **kwargs):
+        self._ensure_worker()
+        if event == 'start_run':
+            self._run_token = next(self._run_tokens)
+            kwargs['run_token'] = self._run_token
+        elif event == 'end_run':
+            self._run_token = None
+        elif event != 'replay_spilled' and self._queue.qsize() >= self.max_queue:
+            self._spill(event, args)
+            return
+        self._queue.put_nowait((event, args, kwargs))
+
+    def _spill(self, event: str, args: tuple):
+        """Write an event that did not fit in the queue to the local fallback directory"""
+        with self._spill_lock:
+            self.fallback_dir.mkdir(parents=True, exist_ok=True)
+            if not self.spill_file.exists():
+                logger.warning(f"MLflow queue full; spilling events to {self.spill_file} until the next flush")
+            if event == 'log_model':
+                model, artifact_path = args
+                model_file = self.fallback_dir / f"spilled-{artifact_path.replace('/', '_')}-{time.time_ns()}.pkl"
+                with open(model_file, 'wb') as f:
+                    pickle.dump(model, f)
+                args = (str(model_file), artifact_path)
+            record = {
+                'time': time.time(), 'experiment': self.experiment_name,
+                'run_token': self._run_token, 'event': event, 'args': args
+            }
+            with open(self.spill_file, 'a') as f:
+                f.write(json.dumps(record, default=str) + '\n')
+            self.spilled_events += 1
+
+    # Public, non-blocking API
+
+    def start_run(self, run_name: Optional[str] = None):
+        self._submit('start_run', run_name)
+
+    def end_run(self):
+        self._submit('end_run')
+
+    @contextmanager
+    def run(self, run_name: Optional[str] = None):
+        self.start_run(run_name)
+        try:
+            yield self
+        finally:
+            self.end_run()
+
+    def log_metric(self, key: str, value: float):
+        self._submit('log_metric', key, float(value))
+
+    def log_param(self, key: str, value):
+        self._submit('log_param', key, value)
+
+    def log_text(self, text: str, artifact_file: str):
+        self._submit('log_text', text, artifact_file)
+
+    def log_model(self, model, artifact_path: str, selected: bool = False):
+        """Queue a model upload; candidates are skipped unless log_models='all'"""
+        if self.log_models == 'all' or (self.log_models == 'best' and selected):
+            self._submit('log_model', model, artifact_path)
+
+    def flush(self):
+        """Block until every queued and spilled event has been logged"""
+        if self._worker is None:
+            return
+        if self.spill_file.exists():
+            self._submit('replay_spilled')
+        self._queue.join()
+
+    def close(self):
+        if self._worker is not None and self._worker.is_alive():
+            self.flush()
+            self._queue.put(('_stop', (), {}))
+            self._worker.join()
+
+    def summary(self) -> str:
+        """Spill, replay and failure counts for the end-of-training report"""
+        return (
+            f"{self.spilled_events} events spilled past the queue, {self.replayed_events} replayed, "
+            f"{self.failed_events} failed"
+        )
+
+    # Worker-side handlers
+
+    def _do_start_run(self, run_name, run_token=None):
+        import mlflow
+        self._run_ids[run_token] = mlflow.start_run(run_name=run_name).info.run_id
+
+    def _do_replay_spilled(self):
+        """Log spilled events into the runs they were submitted for"""
+        import mlflow
+        from mlflow.tracking import MlflowClient
+
+        with self._spill_lock:
+            if not self.spill_file.exists():
+                return
+            replay_file = self.spill_file.with_suffix('.replaying')
+            self.spill_file.replace(replay_file)
+
+        client = MlflowClient()
+        with open(replay_file) as f:
+            records = [json.loads(line) for line in f]
+        for record in records:
+            event, args = record['event'], record['args']
+            run_id = self._run_ids.get(record['run_token'])
+            try:
+                if run_id is None:
+                    raise ValueError("event was submitted outside a run")
+                if event == 'log_model':
+                    with open(args[0], 'rb') as model_file:
+                        model = pickle.load(model_file)
+                    active = mlflow.active_run()
+                    if active is not None and active.info.run_id == run_id:
+                        self._do_log_model(model, args[1])
+                    else:
+                        with mlflow.start_run(run_id=run_id, nested=active is not None):
+                            self._do_log_model(model, args[1])
+                    os.remove(args[0])
+                else:
+                    getattr(client, event)(run_id, *args)
+                self.replayed_events += 1
+            except Exception as e:
+                self.failed_events += 1
+                logger.error(f"Replaying spilled MLflow {event} failed: {e}")
+        replay_file.unlink()
+        logger.info(f"Replayed {len(records)} spilled MLflow events")
+
+    def _do_end_run(self):
+        import mlflow
+        mlflow.end_run()
+
+    def _do_log_metric(self, key, value):
+        import mlflow
+        mlflow.log_metric(key, value)
+
+    def _do_log_param(self, key, value):
+        import mlflow
+        mlflow.log_param(key, value)
+
+    def _do_log_text(self, text, artifact_file):
+        import mlflow
+        mlflow.log_text(text, artifact_file)
+
+    def _do_log_model(self, model, artifact_path):
+        model_type = model.__class__.__name__
+        if model_type == 'XGBClassifier':
+            import mlflow.xgboost
+            mlflow.xgboost.log_model(model, artifact_path)
+        elif model_type == 'LGBMClassifier':
+            import mlflow.lightgbm
+            mlflow.lightgbm.log_model(model, artifact_path)
+        else:
+            import mlflow.sklearn
+            mlflow.sklearn.log_model(model, artifact_path)
@@ -0,0 +1,251 @@
+"""
+Expense Categorization Training Scheduler
+Runs every (model, fold) fit of a training stage as an independent task on a
+process pool, packing tasks by each model's useful thread count under a
+global core budget and pinning nested BLAS/OpenMP threads per task.
+
+Training matrices are dumped once to an uncompressed joblib file and
+memory-mapped read-only by every worker, so memory does not grow with the
+number of workers.
+
+Fold tasks fit an imblearn pipeline on the raw training rows so resampling
+and scaling happen inside each fold, and return their out-of-fold
+predictions and probabilities for reuse. Cost-sensitive runs pass per-row
+sample weights instead of a resampling step.
+"""
+
+import numpy as np
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.utils.class_weight import compute_sample_weight
+from threadpoolctl import threadpool_limits
+from imblearn.pipeline import Pipeline as ImbPipeline
+
+# Threads each model can actually use; None means it scales with the budget
+MODEL_THREAD_CAPS = {
+    'random_forest': None,
+    'gradient_boosting': 1,
+    'logistic_regression': 1,
+    'xgboost': 4,
+    'lightgbm': 4
+}
+
+# Relative serial fit cost, used to start the longest tasks first
+MODEL_COST_HINTS = {
+    'gradient_boosting': 10,
+    'random_forest': 4,
+    'xgboost': 4,
+    'lightgbm': 2,
+    'logistic_regression': 1
+}
+
+# Training data shared with pool workers once, not pickled per task
+_WORKER_DATA = {}
+
+
+def _init_worker(shared_file: str):
+    # Arrays (including CSR data/indices/indptr) map the shared file in place
+    _WORKER_DATA.update(joblib.load(shared_file, mmap_mode='r'))
+
+
+def _run_task(task: Dict) -> Dict:
+    """Fit and score one (model, fold) task inside a pool worker"""
+    if task['fold'] is None:
+        X_fit, y_fit = _WORKER_DATA['X_train'], _WORKER_DATA['y_train']
+        X_eval, y_eval = _WORKER_DATA['X_test'], _WORKER_DATA['y_test']
+        w_fit = _WORKER_DATA['w_train']
+    else:
+        X_cv, y_cv = _WORKER_DATA['X_cv'], _WORKER_DATA['y_cv']
+        X_fit, y_fit = X_cv[task['train_idx']], y_cv[task['train_idx']]
+        X_eval, y_eval = X_cv[task['eval_idx']], y_cv[task['eval_idx']]
+        # Balanced weights from the fold's own class counts
+        w_fit = compute_sample_weight('balanced', y_fit) if task.get('weighted') else None
+
+    estimator = task['estimator']
+    if 'n_jobs' in estimator.get_params():
+        estimator.set_params(n_jobs=task['threads'])
+    fit_params = {}
+    if task.get('steps'):
+        # Resample and scale on the fold's training rows only
+        estimator = ImbPipeline(task['steps'] + [('model', estimator)])
+        if w_fit is not None:
+            fit_params['model__sample_weight'] = w_fit
+    elif w_fit is not None:
+        fit_params['sample_weight'] = w_fit
+
+    # Cap BLAS/OpenMP pools so nested threads stay within this task's share
+    with threadpool_limits(limits=task['threads']):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        estimator.fit(X_fit, y_fit, **fit_params)
+        fit_seconds = time.perf_counter() - wall_start
+
+        predict_start = time.perf_counter()
+        y_pred = estimator.predict(X_eval)
+        y_proba = None
+        if task['fold'] is not None and hasattr(estimator, 'predict_proba'):
+            # Expand to every class in case a fold model saw a subset
+            y_proba = np.zeros((len(y_eval), task['n_classes']))
+            y_proba[:, np.asarray(estimator.classes_, dtype=int)] = estimator.predict_proba(X_eval)
+        predict_seconds = time.perf_counter() - predict_start
+        cpu_seconds = time.process_time() - cpu_start
+
+    return {
+        'model': task['model'],
+        'fold': task['fold'],
+        'threads': task['threads'],
+        'score': accuracy_score(y_eval, y_pred),
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+        'cpu_seconds': cpu_seconds,
+        'pid': os.getpid(),
+        # Only the holdout fit is kept; fold models are discarded
+        'estimator': estimator if task['fold'] is None else None,
+        'eval_idx': task.get('eval_idx'),
+        'y_pred': y_pred,
+        'y_proba': y_proba
+    }
+
+
+class TrainingScheduler:
+    def __init__(self, core_budget: Optional[int] = None, thread_caps: Optional[Dict[str, int]] = None,
+                 shared_dir: Optional[str] = None):
+        self.core_budget = core_budget or os.cpu_count() or 1
+        self.thread_caps = {**MODEL_THREAD_CAPS, **(thread_caps or {})}
+        # Where the memory-mapped training data is written (default: system temp dir)
+        self.shared_dir = shared_dir
+
+    def threads_for(self, model_name: str) -> int:
+        cap = self.thread_caps.get(model_name)
+        return self.core_budget if cap is None else max(1, min(cap, self.core_budget))
+
+    def build_tasks(self, models: Dict, y_cv: np.ndarray, cv: int, fold_steps: List,
+                    fold_weighting: bool = False) -> List[Dict]:
+        """One holdout fit plus one fit per CV fold for every model"""
+        folds = list(StratifiedKFold(n_splits=cv).split(np.zeros(len(y_cv)), y_cv)) if cv else []
+        n_classes = int(np.max(y_cv)) + 1
+
+        tasks = []
+        for name, model in models.items():
+            threads = self.threads_for(name)
+            tasks.append({'model': name, 'fold': None, 'threads': threads, 'estimator': clone(model)})
+            for fold, (train_idx, eval_idx) in enumerate(folds):
+                tasks.append({
+                    'model': name,
+                    'fold': fold,
+                    'threads': threads,
+                    'estimator': clone(model),
+                    'steps': [(step, clone(transformer)) for step, transformer in fold_steps],
+                    'n_classes': n_classes,
+                    'weighted': fold_weighting,
+                    'train_idx': train_idx,
+                    'eval_idx': eval_idx
+                })
+
+        # Longest serial work first, so single-threaded fits don't trail at the end
+        tasks.sort(key=lambda t: MODEL_COST_HINTS.get(t['model'], 1) / t['threads'], reverse=True)
+        return tasks
+
+    def _share_data(self, shared_dir: str, X_train, y_train, X_test, y_test, X_cv, y_cv, w_train) -> str:
+        """Dump the stage's data once for workers to memory-map; returns the file path"""
+        shared_file = os.path.join(shared_dir, 'data.joblib')
+        # Uncompressed so arrays can be mapped; X_cv is stored once when it is X_train
+        joblib.dump({
+            'X_train': X_train, 'y_train': y_train, 'X_test': X_test, 'y_test': y_test,
+            'X_cv': X_cv, 'y_cv': y_cv, 'w_train': w_train
+        }, shared_file, compress=0)
+        return shared_file
+
+    def run(self, models: Dict, X_train, y_train, X_test, y_test, X_cv=None, y_cv=None,
+            fold_steps: Optional[List] = None, cv: int = 5, sample_weight: Optional[np.ndarray] = None,
+            fold_weighting: bool = False) -> Tuple[Dict[str, Dict], Dict]:
+        """Run all fits for a stage; returns per-model results and a timing report
+
+        X_train/y_train are the prepared (resampled, scaled) rows for the
+        holdout fit. Folds are drawn from X_cv/y_cv, which default to the same
+        rows; pass the raw training rows with fold_steps such as
+        [('smote', SMOTE()), ('scaler', StandardScaler())] to resample and
+        scale inside each fold instead.
+
+        sample_weight weights the holdout fit's rows; fold_weighting gives each
+        fold fit balanced weights computed from its own training rows.
+        """
+        if X_cv is None:
+            X_cv, y_cv = X_train, y_train
+        tasks = self.build_tasks(models, y_cv, cv, fold_steps or [], fold_weighting)
+        pending = list(tasks)
+        running = {}
+        completed = []
+        free_cores = self.core_budget
+
+        wall_start = time.perf_counter()
+        if self.shared_dir:
+            Path(self.shared_dir).mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='training-scheduler-', dir=self.shared_dir) as shared_dir:
+            shared_file = self._share_data(shared_dir, X_train, y_train, X_test, y_test, X_cv, y_cv, sample_weight)
+            with ProcessPoolExecutor(max_workers=self.core_budget, initializer=_init_worker,
+                                     initargs=(shared_file,)) as pool:
+                while pending or running:
+                    # Launch every pending task that fits in the free cores
+                    for task in list(pending):
+                        if task['threads'] <= free_cores:
+                            pending.remove(task)
+                            running[pool.submit(_run_task, task)] = task
+                            free_cores -= task['threads']
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        free_cores += running.pop(future)['threads']
+                        completed.append(future.result())
+        wall_seconds = time.perf_counter() - wall_start
+
+        n_classes = int(np.max(y_cv)) + 1
+        results = {}
+        for name in models:
+            model_tasks = [t for t in completed if t['model'] == name]
+            holdout = next(t for t in model_tasks if t['fold'] is None)
+            fold_tasks = sorted((t for t in model_tasks if t['fold'] is not None), key=lambda t: t['fold'])
+            cv_scores = np.array([t['score'] for t in fold_tasks])
+
+            # Stitch fold predictions back into training-row order
+            oof_pred = np.full(len(y_cv), -1, dtype=int)
+            oof_proba = np.full((len(y_cv), n_classes), np.nan)
+            oof_fold = np.full(len(y_cv), -1, dtype=int)
+            for t in fold_tasks:
+                oof_pred[t['eval_idx']] = t['y_pred']
+                oof_fold[t['eval_idx']] = t['fold']
+                if t['y_proba'] is not None:
+                    oof_proba[t['eval_idx']] = t['y_proba']
+
+            results[name] = {
+                'estimator': holdout['estimator'],
+                'y_pred': holdout['y_pred'],
+                'accuracy': holdout['score'],
+                'cv_scores': cv_scores,
+                'cv_mean': cv_scores.mean() if len(cv_scores) else np.nan,
+                'cv_std': cv_scores.std() if len(cv_scores) else np.nan,
+                'oof_pred': oof_pred,
+                'oof_proba': oof_proba,
+                'oof_fold': oof_fold
+            }
+
+        cpu_seconds = sum(t['cpu_seconds'] for t in completed)
+        report = {
+            'core_budget': self.core_budget,
+            'wall_seconds': wall_seconds,
+            'cpu_seconds': cpu_seconds,
+            'core_utilization': cpu_seconds / (wall_seconds * self.core_budget) if wall_seconds else 0.0,
+            'tasks': [
+                {k: v for k, v in t.items() if k not in ('estimator', 'eval_idx', 'y_pred', 'y_proba')}
+                for t in completed
+            ]
+        }
+        return results, report